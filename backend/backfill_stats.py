@@ -0,0 +1,23 @@
+"""Разовое заполнение дневной статистики камер (camera_daily_stats) по существующим записям.
+
+Запуск (из каталога backend):
+    python backfill_stats.py
+
+Сводки считаются заново по всем завершенным записям и перезаписывают дни целиком,
+поэтому повторный запуск безопасен. Новые записи сервер добавляет в сводки сам.
+"""
+import asyncio
+
+import server
+from server import backfill_daily_stats, ensure_indexes, logger
+
+
+async def main():
+    await ensure_indexes()
+    count = await backfill_daily_stats()
+    logger.info(f"Backfilled {count} camera/day rollups")
+    server.client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
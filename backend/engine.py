@@ -0,0 +1,125 @@
+"""Процесс движка камер: захват, анализ движения и запись отдельно от HTTP API.
+
+Запуск (из каталога backend):
+    python engine.py
+    ENGINE_MODE=api uvicorn server:app --port 8001
+
+API-процесс управляет движком и получает кадры через Unix-сокет ENGINE_SOCKET
+(см. engine_ipc.py), поэтому API можно перезапускать без остановки камер.
+
+server импортируется только внутри функций: пул превью (spawn) заново импортирует этот
+модуль как __mp_main__ в каждом воркере, и там не должно быть MongoDB, FastAPI и второго пула.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from engine_ipc import FramePublisher, read_message, write_message
+
+logger = logging.getLogger('engine')
+
+frame_publisher = FramePublisher()
+
+
+async def handle_request(header: dict) -> tuple:
+    """Выполняет команду управления, возвращает (result, payload)"""
+    from server import camera_manager, db, governor, start_camera_pipeline
+
+    op = header.get('op')
+    camera_id = header.get('camera_id')
+
+    if op == 'start':
+        camera = await db.cameras.find_one({"id": camera_id}, {"_id": 0})
+        return bool(camera) and await start_camera_pipeline(camera), b''
+    if op == 'stop':
+        await camera_manager.disconnect_camera(camera_id)
+        return True, b''
+    if op == 'record_start':
+        return await camera_manager.start_recording(camera_id, header.get('camera_name', 'Camera')), b''
+    if op == 'record_stop':
+        await camera_manager.stop_recording(camera_id)
+        return True, b''
+    if op == 'snapshot':
+        data = await camera_manager.snapshot(camera_id)
+        return data is not None, data or b''
+    if op == 'heatmap':
+        data = await camera_manager.heatmap_png(camera_id)
+        return data is not None, data or b''
+    if op == 'settings':
+        camera_manager.reload_settings(camera_id)
+        return True, b''
+    if op == 'status':
+        return {
+            cid: {"recording": cam_data['recording'] is not None, "measured_fps": cam_data['measured_fps']}
+            for cid, cam_data in camera_manager.active_cameras.items()
+        }, b''
+    if op == 'profile':
+        return await camera_manager.profile(camera_id, header['duration'], header.get('stack', False)), b''
+    if op == 'governor':
+        return governor.state(), b''
+    raise ValueError(f"Unknown engine op: {op}")
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        header, _ = await read_message(reader)
+        if header.get('op') == 'subscribe':
+            await frame_publisher.serve(reader, writer)
+            return
+
+        try:
+            result, payload = await handle_request(header)
+            await write_message(writer, {"ok": True, "result": result}, payload)
+        except Exception as e:
+            logger.error(f"Engine op {header.get('op')} failed: {e}", exc_info=True)
+            await write_message(writer, {"ok": False, "error": str(e)})
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    import server
+    from server import camera_manager, cluster_manager, db, ensure_indexes, event_bus, governor, start_camera_pipeline, ws_manager, ENGINE_SOCKET
+
+    if server.ENGINE_MODE == 'api':
+        raise SystemExit("ENGINE_MODE=api is for the API process; run engine.py without it")
+
+    ws_manager.relays.append(frame_publisher)
+    event_bus.relays.append(frame_publisher)
+
+    if os.path.exists(ENGINE_SOCKET):
+        os.unlink(ENGINE_SOCKET)
+    ipc_server = await asyncio.start_unix_server(handle_connection, path=ENGINE_SOCKET)
+    logger.info(f"Camera engine listening on {ENGINE_SOCKET}")
+
+    await ensure_indexes()
+    governor.start()
+    if cluster_manager:
+        await cluster_manager.start()
+    else:
+        # После перезапуска движка поднимаем камеры, которые должны работать
+        for camera in await db.cameras.find({"enabled": True}, {"_id": 0}).to_list(None):
+            asyncio.create_task(start_camera_pipeline(camera))
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with ipc_server:
+        await stop_event.wait()
+
+    logger.info("Camera engine shutting down")
+    governor.stop()
+    if cluster_manager:
+        await cluster_manager.stop()
+    for camera_id in list(camera_manager.active_cameras.keys()):
+        await camera_manager.disconnect_camera(camera_id)
+    server.client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
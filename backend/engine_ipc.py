@@ -0,0 +1,203 @@
+"""IPC между API-процессом и процессом движка камер (engine.py).
+
+Протокол поверх Unix-сокета: каждое сообщение - заголовок struct('>II')
+с длинами JSON-заголовка и бинарного payload, затем сами данные.
+
+Управление: клиент открывает соединение, отправляет {"op": ...} и получает
+{"ok": true, "result": ...} или {"ok": false, "error": "..."}.
+Кадры: после {"op": "subscribe"} движок присылает {"op": "frame", "camera_id": ...}
+с JPEG в payload. Для каждого подписчика хранится только последний кадр камеры,
+поэтому медленный API-процесс не тормозит движок. В том же канале идут события камер
+{"op": "event", "event": {...}} - они не отбрасываются и отправляются раньше кадров.
+В обратную сторону API-процесс сообщает {"op": "viewers", "counts": {camera_id: n}} -
+число своих зрителей JPEG-кадров, по которому governor движка снижает превью без зрителей.
+"""
+import asyncio
+import json
+import logging
+import struct
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>II')
+VIEWERS_REPORT_INTERVAL = 0.5  # Секунды между проверками изменения числа зрителей в API-процессе
+
+
+async def write_message(writer: asyncio.StreamWriter, header: dict, payload: bytes = b''):
+    data = json.dumps(header).encode()
+    writer.write(HEADER.pack(len(data), len(payload)) + data + payload)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    header_size, payload_size = HEADER.unpack(await reader.readexactly(HEADER.size))
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b''
+    return header, payload
+
+
+class FramePublisher:
+    """Раздает кадры подписчикам (API-процессам) с буферизацией "только последний кадр"."""
+    def __init__(self):
+        self.subscribers: Dict[asyncio.StreamWriter, Dict[str, bytes]] = {}
+        self.camera_events: Dict[asyncio.StreamWriter, List[dict]] = {}
+        self.events: Dict[asyncio.StreamWriter, asyncio.Event] = {}
+        self.viewers: Dict[asyncio.StreamWriter, Dict[str, int]] = {}  # Зрители каждого API-процесса
+
+    async def publish(self, camera_id: str, data: bytes):
+        for writer, pending in self.subscribers.items():
+            pending[camera_id] = data
+            self.events[writer].set()
+
+    def publish_event(self, event: dict):
+        for writer, pending in self.camera_events.items():
+            pending.append(event)
+            self.events[writer].set()
+
+    def viewer_count(self, camera_id: str) -> int:
+        return sum(counts.get(camera_id, 0) for counts in self.viewers.values())
+
+    async def read_viewers(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header, _ = await read_message(reader)
+                if header.get('op') == 'viewers':
+                    self.viewers[writer] = header.get('counts', {})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.viewers.pop(writer, None)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Отправляет кадры подписчику до разрыва соединения"""
+        pending: Dict[str, bytes] = {}
+        pending_events: List[dict] = []
+        event = asyncio.Event()
+        self.subscribers[writer] = pending
+        self.camera_events[writer] = pending_events
+        self.events[writer] = event
+        viewers_task = asyncio.create_task(self.read_viewers(reader, writer))
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+                while pending_events:
+                    await write_message(writer, {"op": "event", "event": pending_events.pop(0)})
+                while pending:
+                    camera_id, data = pending.popitem()
+                    await write_message(writer, {"op": "frame", "camera_id": camera_id}, data)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            viewers_task.cancel()
+            self.subscribers.pop(writer, None)
+            self.camera_events.pop(writer, None)
+            self.events.pop(writer, None)
+            self.viewers.pop(writer, None)
+
+
+class EngineClient:
+    """Клиент движка для API-процесса. Интерфейс совпадает с server.LocalEngine."""
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+
+    async def call(self, op: str, **params) -> Tuple[object, bytes]:
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        try:
+            await write_message(writer, {"op": op, **params})
+            header, payload = await read_message(reader)
+        finally:
+            writer.close()
+        if not header.get('ok'):
+            raise RuntimeError(header.get('error', f"Engine call {op} failed"))
+        return header.get('result'), payload
+
+    async def start_camera(self, camera_id: str) -> bool:
+        result, _ = await self.call('start', camera_id=camera_id)
+        return bool(result)
+
+    async def stop_camera(self, camera_id: str):
+        await self.call('stop', camera_id=camera_id)
+
+    async def start_recording(self, camera_id: str, camera_name: str) -> Optional[str]:
+        result, _ = await self.call('record_start', camera_id=camera_id, camera_name=camera_name)
+        return result
+
+    async def stop_recording(self, camera_id: str):
+        await self.call('record_stop', camera_id=camera_id)
+
+    async def snapshot(self, camera_id: str) -> Optional[bytes]:
+        result, payload = await self.call('snapshot', camera_id=camera_id)
+        return payload if result else None
+
+    async def reload_settings(self, camera_id: str):
+        await self.call('settings', camera_id=camera_id)
+
+    async def heatmap(self, camera_id: str) -> Optional[bytes]:
+        result, payload = await self.call('heatmap', camera_id=camera_id)
+        return payload if result else None
+
+    async def is_active(self, camera_id: str) -> bool:
+        result, _ = await self.call('status')
+        return camera_id in result
+
+    async def status(self) -> dict:
+        result, _ = await self.call('status')
+        return result
+
+    async def governor_state(self) -> dict:
+        result, _ = await self.call('governor')
+        return result
+
+    async def profile(self, camera_id: str, duration: float, stack: bool) -> Optional[dict]:
+        result, _ = await self.call('profile', camera_id=camera_id, duration=duration, stack=stack)
+        return result
+
+    async def receive_frames(
+        self,
+        on_frame: Callable[[str, bytes], Awaitable[None]],
+        on_event: Optional[Callable[[dict], None]] = None,
+        viewer_counts: Optional[Callable[[], Dict[str, int]]] = None,
+        retry_delay: float = 1.0
+    ):
+        """Подписка на кадры и события движка с переподключением (движок можно перезапускать).
+        viewer_counts - зрители этого процесса по камерам, движок получает их при изменении."""
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+                logger.info(f"Subscribed to engine frames at {self.socket_path}")
+                report_task = None
+                try:
+                    await write_message(writer, {"op": "subscribe"})
+                    if viewer_counts:
+                        report_task = asyncio.create_task(self.report_viewers(writer, viewer_counts))
+                    while True:
+                        header, payload = await read_message(reader)
+                        if header.get('op') == 'event':
+                            if on_event:
+                                on_event(header['event'])
+                        else:
+                            await on_frame(header['camera_id'], payload)
+                finally:
+                    if report_task:
+                        report_task.cancel()
+                    writer.close()
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, FileNotFoundError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Engine frame channel unavailable: {e}")
+            await asyncio.sleep(retry_delay)
+
+    async def report_viewers(self, writer: asyncio.StreamWriter, viewer_counts: Callable[[], Dict[str, int]]):
+        """Отправляет движку число зрителей: сразу после подписки и затем при каждом изменении"""
+        last = None
+        try:
+            while True:
+                counts = viewer_counts()
+                if counts != last:
+                    await write_message(writer, {"op": "viewers", "counts": counts})
+                    last = counts
+                await asyncio.sleep(VIEWERS_REPORT_INTERVAL)
+        except ConnectionError:
+            pass
@@ -0,0 +1,65 @@
+"""Склейка записей в один файл для экспорта (ffmpeg concat demuxer, без перекодирования).
+
+ffmpeg работает отдельным процессом, event loop только читает строки прогресса.
+"""
+import asyncio
+import zipfile
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+FFMPEG_BIN = 'ffmpeg'
+
+
+def build_concat_list(segments: List[dict]) -> str:
+    """Файл-список для concat demuxer: {'path', 'inpoint', 'outpoint'} на каждую запись"""
+    lines = []
+    for segment in segments:
+        path = str(segment['path']).replace("'", "'\\''")
+        lines.append(f"file '{path}'")
+        if segment.get('inpoint'):
+            lines.append(f"inpoint {segment['inpoint']:.3f}")
+        if segment.get('outpoint') is not None:
+            lines.append(f"outpoint {segment['outpoint']:.3f}")
+    return '\n'.join(lines) + '\n'
+
+
+async def concat_segments(
+    segments: List[dict],
+    output: Path,
+    on_progress: Optional[Callable[[float], Awaitable[None]]] = None
+):
+    """Склеивает сегменты в output (-c copy). on_progress получает секунды готового видео."""
+    list_path = output.with_suffix('.txt')
+    list_path.write_text(build_concat_list(segments))
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_BIN, '-y', '-loglevel', 'error', '-nostats',
+            '-f', 'concat', '-safe', '0', '-i', str(list_path),
+            '-map', '0', '-c', 'copy',
+            '-progress', 'pipe:1',
+            str(output),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            async for line in process.stdout:
+                key, _, value = line.decode(errors='ignore').strip().partition('=')
+                # out_time_ms в ffmpeg исторически содержит микросекунды, как и out_time_us
+                if key in ('out_time_us', 'out_time_ms') and value.isdigit() and on_progress:
+                    await on_progress(int(value) / 1_000_000)
+            stderr = await process.stderr.read()
+            await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(stderr.decode(errors='ignore').strip() or f"ffmpeg exited with {process.returncode}")
+    finally:
+        list_path.unlink(missing_ok=True)
+
+
+def bundle_files(files: List[Path], output: Path):
+    """Складывает файлы камер в один ZIP без сжатия (видео уже сжато)"""
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path in files:
+            archive.write(path, arcname=path.name)
@@ -0,0 +1,62 @@
+"""Тепловая карта движения камеры: где MOG2 фактически видит движение.
+
+Аккумулятор float32 в разрешении анализа движения обновляется на месте через
+cv2.accumulateWeighted - без аллокаций на кадр. Вес нового кадра зависит от прошедшего
+времени, поэтому затухание (half_life) не зависит от того, как часто анализируется движение.
+Значение пикселя - экспоненциальное среднее маски (0..255), т.е. доля времени с движением.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+import cv2
+import numpy as np
+
+HEATMAP_HALF_LIFE = 3600.0  # Секунды, за которые вклад старого движения уменьшается вдвое
+HEATMAP_MIN_SCALE = 2.55  # Нормировка PNG не ниже 1% времени с движением (иначе шум выглядит "горячим")
+
+
+class MotionHeatmap:
+    def __init__(self, width: int, height: int, half_life: float = HEATMAP_HALF_LIFE):
+        self.accumulator = np.zeros((height, width), dtype=np.float32)
+        self.half_life = half_life
+        self.updated_at: Optional[float] = None  # Unix time последнего обновления
+
+    def update(self, fg_mask: np.ndarray, now: float):
+        """Добавляет маску переднего плана (uint8 того же размера)"""
+        if self.updated_at is not None and now > self.updated_at:
+            alpha = 1.0 - 0.5 ** ((now - self.updated_at) / self.half_life)
+            cv2.accumulateWeighted(fg_mask, self.accumulator, alpha)
+        self.updated_at = now
+
+    def to_document(self) -> dict:
+        height, width = self.accumulator.shape
+        return {
+            "width": width,
+            "height": height,
+            "half_life": self.half_life,
+            "data": self.accumulator.astype(np.float16).tobytes(),
+            "updated_at": datetime.fromtimestamp(self.updated_at or 0, timezone.utc).isoformat()
+        }
+
+    @classmethod
+    def from_document(cls, doc: dict, now: float) -> 'MotionHeatmap':
+        """Восстанавливает карту с затуханием за время, пока камера не работала"""
+        heatmap = cls(doc['width'], doc['height'], doc.get('half_life', HEATMAP_HALF_LIFE))
+        data = np.frombuffer(doc['data'], dtype=np.float16).reshape(doc['height'], doc['width'])
+        updated_at = datetime.fromisoformat(doc['updated_at']).timestamp()
+        heatmap.accumulator[:] = data * 0.5 ** (max(0.0, now - updated_at) / heatmap.half_life)
+        heatmap.updated_at = now
+        return heatmap
+
+    def peak(self) -> float:
+        """Максимальная доля времени с движением (0..1)"""
+        return float(self.accumulator.max()) / 255.0
+
+    def to_png(self) -> bytes:
+        """RGBA PNG для наложения на кадр: цвет и прозрачность по относительной активности"""
+        scale = 255.0 / max(float(self.accumulator.max()), HEATMAP_MIN_SCALE)
+        normalized = cv2.convertScaleAbs(self.accumulator, alpha=scale)
+        overlay = cv2.cvtColor(cv2.applyColorMap(normalized, cv2.COLORMAP_JET), cv2.COLOR_BGR2BGRA)
+        overlay[:, :, 3] = normalized
+        _, buffer = cv2.imencode('.png', overlay)
+        return buffer.tobytes()
@@ -0,0 +1,289 @@
+"""Live H.264 без перекодирования: ремукс потока камеры во fragmented MP4 для Media Source Extensions.
+
+ffmpeg копирует видеодорожку (-c:v copy) во fMP4, модуль разбирает MP4-боксы и раздает
+init-сегмент (ftyp+moov) и фрагменты (moof+mdat) подписчикам. Декодирования на сервере нет.
+Для мгновенного старта новый зритель получает фрагменты начиная с последнего ключевого кадра.
+"""
+import asyncio
+import logging
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = 'ffmpeg'
+INIT_TIMEOUT = 10.0  # Секунды ожидания init-сегмента от ffmpeg
+IDLE_LINGER = 5.0  # Секунды работы ffmpeg после ухода последнего зрителя (переподключения)
+CLIENT_QUEUE_SIZE = 32  # Фрагментов в очереди клиента; при переполнении старые отбрасываются
+
+# Флаг sample_is_non_sync_sample в sample_flags (ISO/IEC 14496-12)
+NON_SYNC_SAMPLE = 0x00010000
+
+
+def iter_boxes(data: bytes, offset: int = 0, end: Optional[int] = None):
+    """Итерирует (type, payload_start, box_end) MP4-боксов в data[offset:end]"""
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def find_box(data: bytes, path: List[bytes], offset: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """Находит вложенный бокс по пути типов, возвращает (payload_start, box_end)"""
+    for box_type, start, box_end in iter_boxes(data, offset, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return start, box_end
+            return find_box(data, path[1:], start, box_end)
+    return None
+
+
+def codec_string(init_segment: bytes) -> Optional[str]:
+    """MIME-тип для MediaSource.isTypeSupported или None, если кодек не H.264"""
+    index = init_segment.find(b'avcC')
+    if index < 0 or index + 8 > len(init_segment):
+        return None
+    profile, compat, level = init_segment[index + 5:index + 8]
+    return f'video/mp4; codecs="avc1.{profile:02X}{compat:02X}{level:02X}"'
+
+
+def is_keyframe_fragment(moof: bytes) -> bool:
+    """Начинается ли фрагмент с ключевого кадра (по флагам первого сэмпла в tfhd/trun)"""
+    traf = find_box(moof, [b'moof', b'traf'])
+    if not traf:
+        return False
+    default_flags = None
+    tfhd = find_box(moof, [b'tfhd'], *traf)
+    if tfhd:
+        start, _ = tfhd
+        flags = int.from_bytes(moof[start + 1:start + 4], 'big')
+        pos = start + 8  # version/flags + track_ID
+        for bit, size in ((0x1, 8), (0x2, 4), (0x8, 4), (0x10, 4)):
+            if flags & bit:
+                pos += size
+        if flags & 0x20:
+            default_flags = struct.unpack_from('>I', moof, pos)[0]
+    trun = find_box(moof, [b'trun'], *traf)
+    if not trun:
+        return default_flags is not None and not default_flags & NON_SYNC_SAMPLE
+    start, _ = trun
+    flags = int.from_bytes(moof[start + 1:start + 4], 'big')
+    pos = start + 8  # version/flags + sample_count
+    if flags & 0x1:
+        pos += 4  # data_offset
+    if flags & 0x4:
+        sample_flags = struct.unpack_from('>I', moof, pos)[0]
+    elif flags & 0x400:
+        # Флаги первого сэмпла в таблице сэмплов
+        pos += 4 * bool(flags & 0x100) + 4 * bool(flags & 0x200)
+        sample_flags = struct.unpack_from('>I', moof, pos)[0]
+    elif default_flags is not None:
+        sample_flags = default_flags
+    else:
+        return False
+    return not sample_flags & NON_SYNC_SAMPLE
+
+
+class FragmentedMP4Relay:
+    """Один процесс ffmpeg на камеру, фрагменты раздаются всем MSE-зрителям"""
+    def __init__(self, camera_id: str, url: str):
+        self.camera_id = camera_id
+        self.url = url
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.task: Optional[asyncio.Task] = None
+        self.init_segment: Optional[bytes] = None
+        self.codec: Optional[str] = None
+        self.init_ready = asyncio.Event()
+        self.gop: List[bytes] = []  # Фрагменты с последнего ключевого кадра (не больше CLIENT_QUEUE_SIZE + 1)
+        self.subscribers: List[asyncio.Queue] = []
+        self.waiting_keyframe: Set[asyncio.Queue] = set()  # Клиенты, которым GOP не поместился в очередь
+
+    async def start(self):
+        args = [FFMPEG_BIN, '-loglevel', 'error']
+        if self.url.startswith('rtsp://'):
+            args += ['-rtsp_transport', 'tcp']
+        args += [
+            '-i', self.url,
+            '-map', '0:v:0', '-c:v', 'copy', '-an',
+            '-f', 'mp4',
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            '-frag_duration', '250000',  # Фрагменты по 250 мс для низкой задержки
+            'pipe:1'
+        ]
+        self.process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        self.task = asyncio.create_task(self.read_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+        self.init_ready.set()  # Разбудить ожидающих init: ffmpeg остановлен
+        self.close_subscribers()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def read_box(self, stdout: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+        header = await stdout.readexactly(8)
+        size, box_type = struct.unpack('>I4s', header)
+        if size == 1:
+            large = await stdout.readexactly(8)
+            header += large
+            size = struct.unpack('>Q', large)[0]
+        return box_type, header + await stdout.readexactly(size - len(header))
+
+    async def read_loop(self):
+        stdout = self.process.stdout
+        init_parts = []
+        moof = None
+        try:
+            while True:
+                box_type, box = await self.read_box(stdout)
+                if box_type in (b'ftyp', b'moov') and self.init_segment is None:
+                    init_parts.append(box)
+                    if box_type == b'moov':
+                        self.init_segment = b''.join(init_parts)
+                        self.codec = codec_string(self.init_segment)
+                        self.init_ready.set()
+                elif box_type == b'moof':
+                    moof = box
+                elif box_type == b'mdat' and moof is not None:
+                    self.publish(moof + box, is_keyframe_fragment(moof))
+                    moof = None
+        except asyncio.IncompleteReadError:
+            logger.warning(f"ffmpeg fMP4 stream ended for camera {self.camera_id}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"fMP4 relay failed for camera {self.camera_id}: {e}")
+        finally:
+            self.init_ready.set()
+            self.close_subscribers()
+
+    def publish(self, fragment: bytes, keyframe: bool):
+        if keyframe:
+            self.gop = []
+            self.waiting_keyframe.clear()  # Ожидавшие клиенты начинают с этого фрагмента
+        if len(self.gop) <= CLIENT_QUEUE_SIZE:
+            # Более длинный GOP целиком в очередь не помещается - хранить его дальше незачем
+            self.gop.append(fragment)
+        for queue in self.subscribers:
+            if queue in self.waiting_keyframe:
+                continue
+            if queue.full():
+                # Медленный клиент: фрагменты зависят от предыдущих, поэтому сбрасываем очередь
+                # и продолжаем с последнего ключевого кадра (клиент перейдет к live по буферу)
+                while not queue.empty():
+                    queue.get_nowait()
+                self.replay_gop(queue)
+            else:
+                queue.put_nowait(fragment)
+
+    def replay_gop(self, queue: asyncio.Queue):
+        """Фрагменты текущего GOP с ключевого кадра. Если GOP длиннее очереди (long-GOP камеры),
+        клиент ждет следующий ключевой кадр: декодирование с середины GOP дает битую картинку."""
+        if len(self.gop) > CLIENT_QUEUE_SIZE:
+            self.waiting_keyframe.add(queue)
+            return
+        for fragment in self.gop:
+            queue.put_nowait(fragment)
+
+    def close_subscribers(self):
+        """None в очереди означает конец потока для клиента"""
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.replay_gop(queue)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+        self.waiting_keyframe.discard(queue)
+
+
+class MSEManager:
+    """Запускает ffmpeg-ремукс по требованию и останавливает его без зрителей"""
+    def __init__(self):
+        self.relays: Dict[str, FragmentedMP4Relay] = {}
+        self.stop_tasks: Dict[str, asyncio.Task] = {}
+        self.start_locks: Dict[str, asyncio.Lock] = {}  # Один запуск ffmpeg на камеру
+
+    async def subscribe(self, camera_id: str, url: str) -> Tuple[Optional[FragmentedMP4Relay], Optional[asyncio.Queue]]:
+        """Подписка на fMP4 камеры; (None, None) - если H.264 ремукс недоступен"""
+        stop_task = self.stop_tasks.pop(camera_id, None)
+        if stop_task:
+            stop_task.cancel()
+
+        # Параллельные подписки ждут один и тот же запуск, иначе первый ffmpeg "теряется"
+        async with self.start_locks.setdefault(camera_id, asyncio.Lock()):
+            relay = self.relays.get(camera_id)
+            if relay is None or not relay.running:
+                await self.remove(camera_id)  # Завершившийся ffmpeg: закрыть его подписчиков
+                relay = FragmentedMP4Relay(camera_id, url)
+                try:
+                    await relay.start()
+                except (FileNotFoundError, OSError) as e:
+                    logger.error(f"Cannot start ffmpeg for camera {camera_id}: {e}")
+                    return None, None
+                self.relays[camera_id] = relay
+
+        try:
+            await asyncio.wait_for(relay.init_ready.wait(), timeout=INIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+
+        if not relay.init_segment or not relay.codec:
+            # Нет init-сегмента или кодек не H.264 (например, HEVC) - клиенту нужен JPEG
+            if not relay.subscribers and self.relays.get(camera_id) is relay:
+                await self.remove(camera_id)
+            return None, None
+
+        return relay, relay.subscribe()
+
+    def viewer_count(self, camera_id: str) -> int:
+        relay = self.relays.get(camera_id)
+        return len(relay.subscribers) if relay else 0
+
+    def unsubscribe(self, camera_id: str, queue: asyncio.Queue):
+        relay = self.relays.get(camera_id)
+        if not relay:
+            return
+        relay.unsubscribe(queue)
+        if not relay.subscribers and camera_id not in self.stop_tasks:
+            self.stop_tasks[camera_id] = asyncio.create_task(self.stop_idle(camera_id))
+
+    async def stop_idle(self, camera_id: str):
+        await asyncio.sleep(IDLE_LINGER)
+        self.stop_tasks.pop(camera_id, None)
+        relay = self.relays.get(camera_id)
+        if relay and not relay.subscribers:
+            await self.remove(camera_id)
+
+    async def remove(self, camera_id: str):
+        relay = self.relays.pop(camera_id, None)
+        if relay:
+            await relay.stop()
+
+    async def close(self):
+        for camera_id in list(self.relays.keys()):
+            await self.remove(camera_id)
@@ -0,0 +1,113 @@
+"""Генерация превью записей: постер-кадр и спрайт-лист для скраббинга.
+
+Функции выполняются в пуле процессов, поэтому модуль не импортирует server.py
+(и не создает подключение к MongoDB в дочерних процессах).
+"""
+import math
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+POSTER_SUFFIX = '.poster.jpg'
+SPRITE_SUFFIX = '.sprite.jpg'
+
+
+def preview_paths(filepath: Path) -> Tuple[Path, Path]:
+    """Пути постера и спрайт-листа рядом с файлом записи"""
+    return (
+        filepath.with_name(filepath.stem + POSTER_SUFFIX),
+        filepath.with_name(filepath.stem + SPRITE_SUFFIX),
+    )
+
+
+def _write_jpeg(path: Path, image: np.ndarray, quality: int):
+    # Пишем во временный файл и переименовываем, чтобы не отдать клиенту недописанный JPEG
+    tmp_path = path.with_name(path.stem + '.tmp.jpg')
+    cv2.imwrite(str(tmp_path), image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    os.replace(tmp_path, path)
+
+
+def generate_previews(
+    filepath: str,
+    interval: float = 10.0,
+    tile_width: int = 160,
+    tile_height: int = 90,
+    columns: int = 10,
+    poster_width: int = 640
+) -> Optional[dict]:
+    """Создает постер и спрайт-лист (один тайл каждые interval секунд).
+
+    Возвращает описание спрайта для сохранения в документе записи
+    или None, если из файла не удалось прочитать ни одного кадра.
+    """
+    path = Path(filepath)
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        return None
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0:
+            fps = 25.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, int(round(fps * interval)))
+
+        tiles = []
+        poster = None
+        if frame_count > 0:
+            # Позиционируемся сразу на нужные кадры вместо декодирования всего файла
+            for frame_index in range(0, frame_count, step):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    break
+                tiles.append(cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA))
+                if len(tiles) == 1:
+                    poster = frame
+        else:
+            # Контейнер без индекса: читаем последовательно, декодируя только нужные кадры
+            frame_index = 0
+            while cap.grab():
+                if frame_index % step == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret or frame is None:
+                        break
+                    tiles.append(cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA))
+                    if len(tiles) == 1:
+                        poster = frame
+                frame_index += 1
+
+        if not tiles:
+            return None
+
+        poster_path, sprite_path = preview_paths(path)
+
+        height, width = poster.shape[:2]
+        if width > poster_width:
+            poster = cv2.resize(
+                poster, (poster_width, int(height * poster_width / width)),
+                interpolation=cv2.INTER_AREA
+            )
+        _write_jpeg(poster_path, poster, 80)
+
+        cols = min(columns, len(tiles))
+        rows = math.ceil(len(tiles) / cols)
+        sprite = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+        for i, tile in enumerate(tiles):
+            row, col = divmod(i, cols)
+            sprite[row * tile_height:(row + 1) * tile_height, col * tile_width:(col + 1) * tile_width] = tile
+        _write_jpeg(sprite_path, sprite, 70)
+
+        return {
+            'interval': interval,
+            'count': len(tiles),
+            'columns': cols,
+            'rows': rows,
+            'tile_width': tile_width,
+            'tile_height': tile_height,
+        }
+    finally:
+        cap.release()
@@ -0,0 +1,132 @@
+"""Профилирование конвейера камеры по запросу, без перезапуска сервера.
+
+CameraProfiler подключается к одной камере на ограниченное время и замеряет шаги итерации
+process_camera_stream; для вызовов в пуле потоков отдельно считаются ожидание в очереди
+и выполнение. LoopStackSampler периодически снимает стек потока event loop.
+"""
+import asyncio
+import contextlib
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+
+def _stats(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "total_ms": round(total * 1000, 2),
+        "mean_ms": round(total * 1000 / len(ordered), 3),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class NullProfiler:
+    """Профилировщик по умолчанию: без замеров и без аллокаций на кадр"""
+    _context = contextlib.nullcontext()
+
+    def step(self, name: str):
+        return self._context
+
+    def record(self, name: str, seconds: float):
+        pass
+
+    async def to_thread(self, name: str, func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class CameraProfiler:
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.thread_wait: Dict[str, List[float]] = defaultdict(list)
+        self.thread_exec: Dict[str, List[float]] = defaultdict(list)
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        self.steps[name].append(seconds)
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name].append(time.perf_counter() - start)
+
+    async def to_thread(self, name: str, func, *args, **kwargs):
+        """asyncio.to_thread с разделением времени на ожидание в пуле и выполнение"""
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            return result, started, time.perf_counter()
+
+        result, started, finished = await asyncio.to_thread(run)
+        self.steps[name].append(time.perf_counter() - submitted)
+        self.thread_wait[name].append(started - submitted)
+        self.thread_exec[name].append(finished - started)
+        return result
+
+    def report(self) -> dict:
+        wall = time.perf_counter() - self.started
+        steps = {}
+        for name, samples in self.steps.items():
+            if not samples:
+                continue
+            entry = _stats(samples)
+            entry["share"] = round(sum(samples) / wall, 4) if wall else 0.0
+            if name in self.thread_wait:
+                entry["thread_wait"] = _stats(self.thread_wait[name])
+                entry["thread_exec"] = _stats(self.thread_exec[name])
+            steps[name] = entry
+        return {
+            "camera_id": self.camera_id,
+            "wall_ms": round(wall * 1000, 1),
+            "iterations": len(self.steps.get('iteration', [])),
+            "steps": steps,
+        }
+
+
+class LoopStackSampler(threading.Thread):
+    """Сэмплирует стек потока event loop из фонового потока (формат folded stacks)"""
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def report(self, top: int = 25) -> dict:
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "stacks": [
+                {"stack": stack, "count": count, "share": round(count / self.samples, 4)}
+                for stack, count in self.counts.most_common(top)
+            ],
+        }
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
-from fastapi.responses import StreamingResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -10,14 +10,29 @@ from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Tuple
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import cv2
 import numpy as np
 import asyncio
 import json
 import aiofiles
-from collections import defaultdict
+from collections import defaultdict, deque
 import base64
+import hashlib
+import math
+import socket
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import websockets
+from pymongo.errors import DuplicateKeyError
+import previews
+import exports
+from profiling import NULL_PROFILER, CameraProfiler, LoopStackSampler
+from heatmap import MotionHeatmap
+from engine_ipc import EngineClient
+from mse import MSEManager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,6 +46,40 @@ db = client[os.environ['DB_NAME']]
 RECORDINGS_DIR = ROOT_DIR / 'recordings'
 RECORDINGS_DIR.mkdir(exist_ok=True)
 
+# Превью записей (постер + спрайт-лист) генерируются в отдельных процессах
+PREVIEW_INTERVAL = float(os.environ.get('PREVIEW_INTERVAL', '10'))
+PREVIEW_WORKERS = int(os.environ.get('PREVIEW_WORKERS', '2'))
+PREVIEW_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Экспорт клипов: готовые файлы хранятся в кэше ограниченного размера
+EXPORTS_DIR = ROOT_DIR / 'exports'
+EXPORTS_DIR.mkdir(exist_ok=True)
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '2'))
+EXPORT_CACHE_BYTES = int(os.environ.get('EXPORT_CACHE_BYTES', str(5 * 1024 ** 3)))
+preview_executor = ProcessPoolExecutor(
+    max_workers=PREVIEW_WORKERS,
+    mp_context=multiprocessing.get_context('spawn')
+)
+
+# Cluster mode: камеры распределяются между узлами через lease-документы в MongoDB
+CLUSTER_MODE = os.environ.get('CLUSTER_MODE', '0') == '1'
+NODE_ID = os.environ.get('NODE_ID') or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+NODE_URL = os.environ.get('NODE_URL', 'http://127.0.0.1:8001')  # Адрес узла, доступный другим узлам
+CLUSTER_LEASE_TTL = float(os.environ.get('CLUSTER_LEASE_TTL', '15'))
+CLUSTER_HEARTBEAT = float(os.environ.get('CLUSTER_HEARTBEAT', '5'))
+
+# Режим движка камер: embedded - камеры обрабатываются в процессе API,
+# api - камеры работают в отдельном процессе engine.py (управление и кадры через Unix-сокет)
+ENGINE_MODE = os.environ.get('ENGINE_MODE', 'embedded')
+ENGINE_SOCKET = os.environ.get('ENGINE_SOCKET', str(ROOT_DIR / 'engine.sock'))
+# Настройки камеры кэшируются в потоке обработки; изменения через API применяются сразу,
+# период обновления нужен для изменений с других узлов
+SETTINGS_REFRESH_SEC = 5.0
+# Список камер отдается из снимка в памяти; снимок сбрасывается при изменениях через API,
+# максимальный возраст - для изменений из других процессов (движок, узлы кластера)
+CAMERA_LIST_MAX_AGE = 30.0
+MEASURED_FPS_WINDOW = 5.0  # Окно замера фактического fps камеры (сек)
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -43,6 +92,10 @@ logger = logging.getLogger(__name__)
 class ExclusionZone(BaseModel):
     points: List[Tuple[int, int]]  # List of (x, y) coordinates
 
+class MotionZone(BaseModel):
+    name: str
+    points: List[Tuple[int, int]]  # Именованная зона для индекса событий (не маскирует движение)
+
 class MotionSettings(BaseModel):
     enabled: bool = True  # Запись при движении
     sensitivity: int = 25  # Чувствительность MOG2 (1-100, меньше = более чувствительный)
@@ -64,13 +117,28 @@ class Camera(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
     status: str = "inactive"  # inactive, active, recording, error
+    enabled: bool = False  # Камера должна работать (в cluster mode узлы разбирают такие камеры)
     codec: Optional[str] = None
     resolution: Optional[str] = None
     bitrate: Optional[str] = None
     fps: Optional[float] = None
     exclusion_zones: List[ExclusionZone] = []
+    motion_zones: List[MotionZone] = []
     motion_settings: MotionSettings = Field(default_factory=MotionSettings)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Живые поля из состояния конвейера, в БД не хранятся
+    measured_fps: Optional[float] = None
+    viewers: int = 0
+
+LIVE_CAMERA_FIELDS = {'measured_fps', 'viewers'}
+
+class RecordingPreview(BaseModel):
+    interval: float  # Секунды между тайлами спрайта
+    count: int
+    columns: int
+    rows: int
+    tile_width: int
+    tile_height: int
 
 class Recording(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -83,33 +151,116 @@ class Recording(BaseModel):
     duration: Optional[float] = None
     motion_events: int = 0
     file_size: Optional[int] = None
+    preview: Optional[RecordingPreview] = None
+
+class MotionEvent(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    camera_id: str
+    camera_name: str
+    recording_id: Optional[str] = None
+    start_time: datetime
+    end_time: datetime
+    bbox: Optional[Tuple[int, int, int, int]] = None  # (x, y, w, h) в координатах кадра камеры
+    peak_pixels: int = 0  # Максимум пикселей движения на кадре анализа (320x180)
+    zones: List[str] = []  # Имена motion_zones, в которых было движение
+
+class CameraDailyStats(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    camera_id: str
+    camera_name: str
+    date: str  # YYYY-MM-DD (UTC, по времени начала записи)
+    recordings: int = 0
+    duration: float = 0.0  # Секунды
+    bytes: int = 0
+    motion_events: int = 0
+
+class CameraStatsTotal(BaseModel):
+    camera_id: str
+    camera_name: str
+    days: int  # Дней с записями в выбранном диапазоне
+    recordings: int = 0
+    duration: float = 0.0
+    bytes: int = 0
+    motion_events: int = 0
+
+class CameraStats(BaseModel):
+    days: List[CameraDailyStats]
+    totals: List[CameraStatsTotal]
+
+class ExportCreate(BaseModel):
+    camera_ids: List[str]
+    start_time: datetime
+    end_time: datetime
+
+class ExportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    camera_ids: List[str]
+    start_time: datetime
+    end_time: datetime
+    status: str = "queued"  # queued, running, done, failed, expired
+    progress: float = 0.0  # 0..1
+    filename: Optional[str] = None
+    file_size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    completed_at: Optional[datetime] = None
+    node_id: Optional[str] = None  # Узел, выполняющий экспорт (файлы лежат в его EXPORTS_DIR)
 
 class CameraUpdate(BaseModel):
     name: Optional[str] = None
     exclusion_zones: Optional[List[ExclusionZone]] = None
+    motion_zones: Optional[List[MotionZone]] = None
     motion_settings: Optional[MotionSettings] = None
 
+async def generate_recording_previews(recording_id: str, filepath: Path):
+    """Генерирует постер и спрайт-лист записи в пуле процессов"""
+    if not filepath.exists():
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        preview = await loop.run_in_executor(
+            preview_executor, previews.generate_previews, str(filepath), PREVIEW_INTERVAL
+        )
+    except Exception as e:
+        logger.error(f"Failed to generate previews for recording {recording_id}: {e}")
+        return
+    
+    if preview:
+        await db.recordings.update_one({"id": recording_id}, {"$set": {"preview": preview}})
+        logger.info(f"Generated previews for recording {recording_id}: {preview['count']} tiles")
+
+def build_camera_url(camera: dict) -> str:
+    """URL потока камеры с учетными данными, если они заданы отдельно"""
+    url = camera['url']
+    username = camera.get('username')
+    password = camera.get('password')
+    if username and password and not ('@' in url):
+        # Insert credentials into URL
+        if url.startswith('rtsp://'):
+            url = f"rtsp://{username}:{password}@{url[7:]}"
+        elif url.startswith('http://'):
+            url = f"http://{username}:{password}@{url[7:]}"
+    return url
+
 # Camera Manager - Singleton for managing camera connections
 class CameraManager:
     def __init__(self):
         self.active_cameras: Dict[str, dict] = {}  # camera_id -> {cap, task, recording, mog2}
+        self.preview_tasks: set = set()  # Фоновые задачи генерации превью
         
     async def connect_camera(self, camera: Camera) -> bool:
         try:
             # Build URL with auth if provided
-            url = camera.url
-            if camera.username and camera.password and not ('@' in url):
-                # Insert credentials into URL
-                if url.startswith('rtsp://'):
-                    url = f"rtsp://{camera.username}:{camera.password}@{url[7:]}"
-                elif url.startswith('http://'):
-                    url = f"http://{camera.username}:{camera.password}@{url[7:]}"
+            url = build_camera_url(camera.model_dump())
             
             # Open video capture in a thread to avoid blocking
             cap = await asyncio.to_thread(cv2.VideoCapture, url)
             
             if not cap.isOpened():
                 logger.error(f"Failed to open camera {camera.id}: VideoCapture could not open stream")
+                event_bus.publish('camera.error', camera.id, error="Could not open stream")
                 return False
             
             # Try to read a test frame to verify stream works
@@ -117,6 +268,7 @@ class CameraManager:
             if not ret or test_frame is None:
                 logger.error(f"Failed to read test frame from camera {camera.id}")
                 cap.release()
+                event_bus.publish('camera.error', camera.id, error="Could not read test frame")
                 return False
             
             logger.info(f"Successfully read test frame from camera {camera.id}: shape={test_frame.shape}")
@@ -159,15 +311,24 @@ class CameraManager:
                 'recording': None,
                 'task': None,
                 'url': url,
-                'codec': codec_str
+                'codec': codec_str,
+                'settings': None,  # Кэш настроек из БД (см. SETTINGS_REFRESH_SEC)
+                'settings_time': 0.0,
+                'measured_fps': None,  # Фактический fps чтения за MEASURED_FPS_WINDOW
+                'heatmap': await load_motion_heatmap(camera.id),
+                'profiler': None  # CameraProfiler во время профилирования
             }
+            camera_list_cache.invalidate()
             
             logger.info(f"Camera {camera.id} connected: {width}x{height} @ {fps}fps, codec: {codec_str}")
+            event_bus.publish('camera.connected', camera.id, resolution=f"{width}x{height}", codec=codec_str)
             return True
             
         except Exception as e:
             logger.error(f"Error connecting to camera {camera.id}: {e}", exc_info=True)
             await db.cameras.update_one({"id": camera.id}, {"$set": {"status": "error"}})
+            camera_list_cache.invalidate()
+            event_bus.publish('camera.error', camera.id, error=str(e))
             return False
     
     async def disconnect_camera(self, camera_id: str):
@@ -186,8 +347,12 @@ class CameraManager:
             if cam_data['cap']:
                 await asyncio.to_thread(cam_data['cap'].release)
             
+            await save_motion_heatmap(camera_id, cam_data['heatmap'])
+            ws_manager.latest_frames.pop(camera_id, None)
             del self.active_cameras[camera_id]
             await db.cameras.update_one({"id": camera_id}, {"$set": {"status": "inactive"}})
+            camera_list_cache.invalidate()
+            event_bus.publish('camera.disconnected', camera_id)
             logger.info(f"Camera {camera_id} disconnected")
     
     async def start_recording(self, camera_id: str, camera_name: str) -> Optional[str]:
@@ -241,7 +406,9 @@ class CameraManager:
         await db.recordings.insert_one(doc)
         
         await db.cameras.update_one({"id": camera_id}, {"$set": {"status": "recording"}})
+        camera_list_cache.invalidate()
         
+        event_bus.publish('recording.start', camera_id, recording_id=recording_id)
         logger.info(f"Started recording for camera {camera_id}: {filename}")
         return recording_id
     
@@ -273,32 +440,420 @@ class CameraManager:
                 "motion_events": recording['motion_events']
             }}
         )
+        await add_daily_stats(
+            camera_id, recording['camera_name'], recording['start_time'],
+            duration, file_size, recording['motion_events']
+        )
         
         cam_data['recording'] = None
         await db.cameras.update_one({"id": camera_id}, {"$set": {"status": "active"}})
+        camera_list_cache.invalidate()
+        
+        # Постер и спрайт-лист строим в фоне, не блокируя поток камеры
+        task = asyncio.create_task(generate_recording_previews(recording['id'], recording['filepath']))
+        self.preview_tasks.add(task)
+        task.add_done_callback(self.preview_tasks.discard)
         
+        event_bus.publish(
+            'recording.stop', camera_id,
+            recording_id=recording['id'], duration=round(duration, 1), file_size=file_size
+        )
         logger.info(f"Stopped recording for camera {camera_id}")
     
     def is_connected(self, camera_id: str) -> bool:
         return camera_id in self.active_cameras
+    
+    def reload_settings(self, camera_id: str):
+        """Сбрасывает кэш настроек - поток перечитает их из БД на следующем кадре"""
+        if camera_id in self.active_cameras:
+            self.active_cameras[camera_id]['settings'] = None
+    
+    async def heatmap_png(self, camera_id: str) -> Optional[bytes]:
+        """Текущая тепловая карта движения в PNG или None, если камера не подключена"""
+        if camera_id not in self.active_cameras:
+            return None
+        return await asyncio.to_thread(self.active_cameras[camera_id]['heatmap'].to_png)
+    
+    async def profile(self, camera_id: str, duration: float, stack: bool = False, stack_interval: float = 0.005) -> Optional[dict]:
+        """Профилирует итерации process_camera_stream камеры в течение duration секунд"""
+        cam_data = self.active_cameras.get(camera_id)
+        if cam_data is None:
+            return None
+        if cam_data.get('profiler'):
+            raise RuntimeError("Camera is already being profiled")
+        
+        profiler = CameraProfiler(camera_id)
+        sampler = LoopStackSampler(threading.get_ident(), stack_interval) if stack else None
+        cam_data['profiler'] = profiler
+        if sampler:
+            sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            if sampler:
+                await asyncio.to_thread(sampler.stop)
+            cam_data['profiler'] = None
+        
+        report = profiler.report()
+        report['governor_level'] = governor.level
+        if sampler:
+            report['loop_stacks'] = sampler.report()
+        return report
+    
+    async def snapshot(self, camera_id: str) -> Optional[bytes]:
+        """Текущий кадр камеры в JPEG или None, если камера не подключена"""
+        if camera_id not in self.active_cameras:
+            return None
+        
+        cap = self.active_cameras[camera_id]['cap']
+        
+        # Read current frame
+        ret, frame = await asyncio.to_thread(cap.read)
+        
+        if not ret or frame is None:
+            raise RuntimeError("Failed to capture frame")
+        
+        # Encode to JPEG
+        _, buffer = await asyncio.to_thread(
+            cv2.imencode, '.jpg', frame, 
+            [cv2.IMWRITE_JPEG_QUALITY, 85]
+        )
+        return buffer.tobytes()
 
 camera_manager = CameraManager()
 
+def to_utc_iso(value: datetime) -> str:
+    """ISO-строка в UTC - в таком виде время хранится в MongoDB и сравнивается как строка"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+# Дневная статистика камер (camera_daily_stats): один документ на камеру и день,
+# обновляется инкрементально при завершении записи
+def daily_stats_id(camera_id: str, day: str) -> str:
+    return f"{camera_id}:{day}"
+
+async def add_daily_stats(camera_id: str, camera_name: str, start_time: datetime,
+                          duration: float, file_size: int, motion_events: int):
+    day = to_utc_iso(start_time)[:10]
+    try:
+        await db.camera_daily_stats.update_one(
+            {"_id": daily_stats_id(camera_id, day)},
+            {
+                "$inc": {"recordings": 1, "duration": duration, "bytes": file_size, "motion_events": motion_events},
+                "$set": {"camera_name": camera_name},
+                "$setOnInsert": {"camera_id": camera_id, "date": day}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to update daily stats for camera {camera_id}: {e}")
+
+async def backfill_daily_stats() -> int:
+    """Пересчитывает camera_daily_stats по всем завершенным записям (разовая миграция, см. backfill_stats.py).
+    Дни перезаписываются целиком, поэтому повторный запуск безопасен. Записи, завершившиеся во время
+    пересчета, могут не попасть в итог - запускайте при остановленных камерах."""
+    rollups: Dict[str, dict] = {}
+    cursor = db.recordings.find(
+        {"end_time": {"$ne": None}},
+        {"_id": 0, "camera_id": 1, "camera_name": 1, "start_time": 1, "duration": 1, "file_size": 1, "motion_events": 1}
+    )
+    async for recording in cursor:
+        start_time = recording['start_time']
+        day = (to_utc_iso(start_time) if isinstance(start_time, datetime) else start_time)[:10]
+        rollup = rollups.setdefault(daily_stats_id(recording['camera_id'], day), {
+            "camera_id": recording['camera_id'],
+            "camera_name": recording.get('camera_name', 'Camera'),
+            "date": day,
+            "recordings": 0,
+            "duration": 0.0,
+            "bytes": 0,
+            "motion_events": 0
+        })
+        rollup['recordings'] += 1
+        rollup['duration'] += recording.get('duration') or 0.0
+        rollup['bytes'] += recording.get('file_size') or 0
+        rollup['motion_events'] += recording.get('motion_events') or 0
+    
+    for rollup_id, rollup in rollups.items():
+        await db.camera_daily_stats.replace_one({"_id": rollup_id}, rollup, upsert=True)
+    return len(rollups)
+
+# Export Manager - фоновые задачи экспорта клипов
+class ExportManager:
+    """Очередь экспорта: ffmpeg-процессы (не больше EXPORT_CONCURRENCY одновременно),
+    прогресс в памяти с рассылкой подписчикам, готовые файлы в кэше до EXPORT_CACHE_BYTES."""
+    def __init__(self):
+        self.jobs: Dict[str, dict] = {}  # Активные задачи: job_id -> документ задачи
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+        self.semaphore: Optional[asyncio.Semaphore] = None
+    
+    async def create(self, request: ExportCreate) -> dict:
+        job = ExportJob(
+            camera_ids=request.camera_ids, start_time=request.start_time, end_time=request.end_time,
+            node_id=NODE_ID
+        )
+        doc = job.model_dump()
+        for key in ('start_time', 'end_time', 'created_at'):
+            doc[key] = to_utc_iso(doc[key])
+        await db.exports.insert_one(dict(doc))
+        
+        self.jobs[job.id] = doc
+        task = asyncio.create_task(self.run(job.id))
+        self.tasks[job.id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job.id, None))
+        return doc
+    
+    async def get(self, job_id: str) -> Optional[dict]:
+        if job_id in self.jobs:
+            return dict(self.jobs[job_id])
+        return await db.exports.find_one({"id": job_id}, {"_id": 0})
+    
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers[job_id].append(queue)
+        return queue
+    
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        if queue in self.subscribers.get(job_id, []):
+            self.subscribers[job_id].remove(queue)
+            if not self.subscribers[job_id]:
+                del self.subscribers[job_id]
+    
+    async def update(self, job_id: str, persist: bool = True, **fields):
+        job = self.jobs[job_id]
+        job.update(fields)
+        for queue in self.subscribers.get(job_id, []):
+            queue.put_nowait(dict(job))
+        if persist:
+            await db.exports.update_one({"id": job_id}, {"$set": fields})
+    
+    async def run(self, job_id: str):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(EXPORT_CONCURRENCY)
+        job = self.jobs[job_id]
+        try:
+            async with self.semaphore:
+                await self.update(job_id, status="running")
+                filename = await self.export(job)
+            filepath = EXPORTS_DIR / filename
+            await self.update(
+                job_id, status="done", progress=1.0, filename=filename,
+                file_size=filepath.stat().st_size,
+                completed_at=datetime.now(timezone.utc).isoformat()
+            )
+            logger.info(f"Export {job_id} finished: {filename}")
+        except asyncio.CancelledError:
+            await self.update(job_id, status="failed", error="Cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Export {job_id} failed: {e}")
+            await self.update(job_id, status="failed", error=str(e))
+        finally:
+            self.jobs.pop(job_id, None)
+            for queue in self.subscribers.get(job_id, []):
+                queue.put_nowait(None)
+        
+        await self.enforce_cache_limit()
+        await self.sweep_orphans()
+    
+    async def export(self, job: dict) -> str:
+        job_id = job['id']
+        recordings = await db.recordings.find(
+            {
+                "camera_id": {"$in": job['camera_ids']},
+                "start_time": {"$lt": job['end_time']},
+                "end_time": {"$gt": job['start_time']}
+            },
+            {"_id": 0}
+        ).sort("start_time", 1).to_list(None)
+        
+        range_start = datetime.fromisoformat(job['start_time'])
+        range_end = datetime.fromisoformat(job['end_time'])
+        
+        # Сегменты по камерам с обрезкой по диапазону (inpoint/outpoint в секундах от начала записи)
+        per_camera: Dict[str, List[dict]] = defaultdict(list)
+        camera_names: Dict[str, str] = {}
+        total_seconds = 0.0
+        for rec in recordings:
+            path = RECORDINGS_DIR / rec['filename']
+            if not path.exists():
+                continue
+            rec_start = datetime.fromisoformat(rec['start_time'])
+            duration = rec.get('duration') or 0.0
+            inpoint = max((range_start - rec_start).total_seconds(), 0.0)
+            outpoint = min((range_end - rec_start).total_seconds(), duration)
+            if outpoint <= inpoint:
+                continue
+            per_camera[rec['camera_id']].append({
+                'path': path,
+                'inpoint': inpoint,
+                'outpoint': outpoint if outpoint < duration else None,
+                'length': outpoint - inpoint
+            })
+            camera_names[rec['camera_id']] = rec.get('camera_name', 'camera')
+            total_seconds += outpoint - inpoint
+        
+        if not per_camera:
+            raise ValueError("No recordings in the requested range")
+        
+        done_seconds = 0.0
+        last_persist = 0.0
+        outputs = []
+        bundle = EXPORTS_DIR / f"export_{job_id[:8]}.zip"
+        try:
+            for camera_id, segments in per_camera.items():
+                safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in camera_names[camera_id])
+                output = EXPORTS_DIR / f"export_{job_id[:8]}_{safe_name}_{camera_id[:8]}.mkv"
+                outputs.append(output)  # До запуска ffmpeg: частичный файл тоже удаляется при ошибке
+                
+                async def on_progress(seconds: float, base: float = done_seconds):
+                    nonlocal last_persist
+                    progress = min((base + seconds) / total_seconds, 0.99) if total_seconds else 0.0
+                    now = time.monotonic()
+                    # Подписчикам - каждое обновление, в MongoDB - не чаще раза в секунду
+                    persist = now - last_persist > 1.0
+                    if persist:
+                        last_persist = now
+                    await self.update(job_id, persist=persist, progress=round(progress, 3))
+                
+                await exports.concat_segments(segments, output, on_progress)
+                done_seconds += sum(segment['length'] for segment in segments)
+            
+            if len(outputs) == 1:
+                return outputs[0].name
+            
+            # Несколько камер - один ZIP (упаковка без сжатия, в отдельном потоке)
+            await asyncio.to_thread(exports.bundle_files, outputs, bundle)
+        except BaseException:
+            # Ошибка или отмена: не оставляем в кэше файлы, на которые не ссылается ни одна задача
+            for path in outputs + [bundle]:
+                path.unlink(missing_ok=True)
+            raise
+        
+        for output in outputs:
+            output.unlink(missing_ok=True)
+        return bundle.name
+    
+    async def enforce_cache_limit(self):
+        """Удаляет самые старые готовые экспорты, пока кэш больше EXPORT_CACHE_BYTES"""
+        done = await db.exports.find(
+            {"status": "done"}, {"_id": 0, "id": 1, "filename": 1, "file_size": 1}
+        ).sort("completed_at", -1).to_list(None)
+        total = 0
+        for job in done:
+            total += job.get('file_size') or 0
+            if total > EXPORT_CACHE_BYTES:
+                (EXPORTS_DIR / job['filename']).unlink(missing_ok=True)
+                await db.exports.update_one({"id": job['id']}, {"$set": {"status": "expired"}})
+                logger.info(f"Export {job['id']} evicted from cache")
+    
+    async def fail_stale_jobs(self):
+        """Помечает failed задачи, прерванные перезапуском: их узел (или этот процесс) не работает"""
+        live_nodes = await db.cluster_nodes.distinct(
+            "_id", {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        stale = {"status": {"$in": ["queued", "running"]}, "id": {"$nin": list(self.jobs)}}
+        result = await db.exports.update_many(
+            {**stale, "$or": [{"node_id": NODE_ID}, {"node_id": {"$nin": live_nodes}}]},
+            {"$set": {"status": "failed", "error": "Interrupted by restart"}}
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} interrupted exports as failed")
+    
+    async def sweep_orphans(self):
+        """Удаляет из EXPORTS_DIR файлы, на которые не ссылается ни одна задача"""
+        jobs = await db.exports.find(
+            {"status": {"$in": ["queued", "running", "done"]}}, {"_id": 0, "id": 1, "status": 1, "filename": 1}
+        ).to_list(None)
+        referenced = {job['filename'] for job in jobs if job['status'] == "done" and job.get('filename')}
+        # Файлы незавершенных задач (mkv по камерам, список concat, zip) начинаются с export_<id[:8]>
+        in_progress = tuple(f"export_{job['id'][:8]}" for job in jobs if job['status'] != "done")
+        for path in EXPORTS_DIR.iterdir():
+            if path.is_file() and path.name not in referenced and not path.name.startswith(in_progress):
+                path.unlink(missing_ok=True)
+                logger.info(f"Removed orphaned export file {path.name}")
+    
+    async def start(self):
+        await self.fail_stale_jobs()
+        await self.sweep_orphans()
+        await self.enforce_cache_limit()
+    
+    async def close(self):
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+export_manager = ExportManager()
+
 # WebSocket connections manager
+class FrameSlot:
+    """Последний JPEG-кадр для одного HTTP-клиента (MJPEG): broadcast не ждет медленных клиентов,
+    промежуточные кадры просто перезаписываются"""
+    def __init__(self, frame: Optional[bytes] = None):
+        self.frame = frame
+        self.event = asyncio.Event()
+        if frame is not None:
+            self.event.set()
+    
+    def put(self, data: bytes):
+        self.frame = data
+        self.event.set()
+    
+    async def get(self) -> bytes:
+        await self.event.wait()
+        self.event.clear()
+        return self.frame
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, List[WebSocket]] = defaultdict(list)
+        self.frame_slots: Dict[str, List[FrameSlot]] = defaultdict(list)  # MJPEG-клиенты /live.mjpg
+        self.latest_frames: Dict[str, bytes] = {}  # Первый кадр для нового MJPEG-клиента без ожидания
+        self.relays: list = []  # Дополнительные получатели кадров (например, FramePublisher движка)
     
     async def connect(self, camera_id: str, websocket: WebSocket):
         await websocket.accept()
         self.active_connections[camera_id].append(websocket)
     
+    def subscribe_frames(self, camera_id: str) -> FrameSlot:
+        slot = FrameSlot(self.latest_frames.get(camera_id))
+        self.frame_slots[camera_id].append(slot)
+        return slot
+    
+    def unsubscribe_frames(self, camera_id: str, slot: FrameSlot):
+        if slot in self.frame_slots.get(camera_id, ()):
+            self.frame_slots[camera_id].remove(slot)
+    
+    def viewer_count(self, camera_id: str) -> int:
+        return len(self.active_connections.get(camera_id, ())) + len(self.frame_slots.get(camera_id, ()))
+    
+    def viewer_counts(self) -> Dict[str, int]:
+        """Зрители JPEG-кадров по камерам (отправляются движку при ENGINE_MODE=api)"""
+        counts = {}
+        for camera_id in set(self.active_connections) | set(self.frame_slots):
+            count = self.viewer_count(camera_id)
+            if count:
+                counts[camera_id] = count
+        return counts
+    
+    def has_viewers(self, camera_id: str) -> bool:
+        # Зрители других процессов (API при ENGINE_MODE=api) приходят через relay движка
+        return self.viewer_count(camera_id) > 0 or any(relay.viewer_count(camera_id) for relay in self.relays)
+    
     def disconnect(self, camera_id: str, websocket: WebSocket):
         if camera_id in self.active_connections:
             if websocket in self.active_connections[camera_id]:
                 self.active_connections[camera_id].remove(websocket)
     
     async def broadcast(self, camera_id: str, data: bytes):
+        for relay in self.relays:
+            await relay.publish(camera_id, data)
+        
+        self.latest_frames[camera_id] = data
+        for slot in self.frame_slots.get(camera_id, ()):
+            slot.put(data)
+        
         if camera_id in self.active_connections:
             disconnected = []
             for connection in self.active_connections[camera_id]:
@@ -312,6 +867,546 @@ class ConnectionManager:
 
 ws_manager = ConnectionManager()
 
+# События камер для /api/ws/events (вместо опроса REST)
+EVENT_BUFFER_SIZE = 1000  # Последние события для докачки после переподключения клиента
+EVENT_CLIENT_QUEUE = 256  # Очередь клиента; при переполнении клиент отключается и дочитывает из буфера
+
+class EventBus:
+    """Публикует переходы состояния камер: motion.start/end, recording.start/stop,
+    camera.connected/disconnected/error/reconnected. Номера событий (seq) действительны
+    в пределах одного запуска процесса (stream_id)."""
+    def __init__(self):
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=EVENT_BUFFER_SIZE)  # (event, json)
+        self.subscribers: Dict[asyncio.Queue, Tuple[Optional[set], Optional[set]]] = {}
+        self.relays: list = []  # Например, FramePublisher движка пересылает события API-процессу
+    
+    def publish(self, topic: str, camera_id: str, **data):
+        self.publish_event({
+            "topic": topic,
+            "camera_id": camera_id,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "data": data
+        })
+    
+    def publish_event(self, event: dict):
+        """Нумерует и рассылает событие (в т.ч. пришедшее от процесса движка со своим seq)"""
+        self.seq += 1
+        event = {"seq": self.seq, **{key: value for key, value in event.items() if key != 'seq'}}
+        text = json.dumps(event, separators=(',', ':'))
+        self.buffer.append((event, text))
+        for relay in self.relays:
+            relay.publish_event(event)
+        for queue, event_filter in list(self.subscribers.items()):
+            if not self.matches(event, event_filter):
+                continue
+            if queue.full():
+                # Клиент не успевает: закрываем соединение, после переподключения он дочитает буфер по since
+                del self.subscribers[queue]
+                queue.get_nowait()
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(text)
+    
+    @staticmethod
+    def matches(event: dict, event_filter: Tuple[Optional[set], Optional[set]]) -> bool:
+        topics, camera_ids = event_filter
+        if camera_ids and event['camera_id'] not in camera_ids:
+            return False
+        # Фильтр по полному имени (motion.start) или по группе (motion)
+        return not topics or event['topic'] in topics or event['topic'].split('.', 1)[0] in topics
+    
+    def subscribe(self, topics: Optional[set], camera_ids: Optional[set], since: Optional[int]) -> Tuple[asyncio.Queue, List[str], bool]:
+        """Очередь новых событий и события из буфера с seq > since.
+        Третий элемент - False, если часть событий после since уже вытеснена из буфера."""
+        event_filter = (topics, camera_ids)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_CLIENT_QUEUE)
+        self.subscribers[queue] = event_filter
+        if since is None:
+            return queue, [], True
+        complete = since <= self.seq and (not self.buffer or self.buffer[0][0]['seq'] <= since + 1)
+        replay = [text for event, text in self.buffer if event['seq'] > since and self.matches(event, event_filter)]
+        return queue, replay, complete
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+event_bus = EventBus()
+
+# Governor - глобальный бюджет CPU и сброс нагрузки конвейера камер
+GOVERNOR_INTERVAL = 1.0  # Период замера задержки event loop и загрузки
+GOVERNOR_LAG_HIGH = 0.1  # Задержка event loop (сек), при которой нагрузка считается высокой
+GOVERNOR_LAG_LOW = 0.02
+GOVERNOR_UTIL_HIGH = 0.85  # Доля CPU машины, занятая процессом (process_time, а не время ожидания кадров)
+GOVERNOR_UTIL_LOW = 0.6
+GOVERNOR_ESCALATE_AFTER = 3  # Замеров подряд под нагрузкой до повышения уровня
+GOVERNOR_RECOVER_AFTER = 10  # Замеров подряд без нагрузки до понижения уровня
+
+# Уровни сброса нагрузки в порядке приоритета. Запись в файл не ограничивается никогда.
+# motion_every - MOG2 на каждом N-м кадре; preview_every - JPEG-превью на каждом N-м кадре (0 - выкл),
+# idle_* - для камер без зрителей
+GOVERNOR_LEVELS = [
+    {'name': 'normal', 'motion_every': 3, 'preview_every': 2, 'idle_preview_every': 2, 'idle_preview_size': (640, 360)},
+    {'name': 'idle-preview-reduced', 'motion_every': 3, 'preview_every': 2, 'idle_preview_every': 10, 'idle_preview_size': (320, 180)},
+    {'name': 'idle-preview-off-motion-reduced', 'motion_every': 6, 'preview_every': 2, 'idle_preview_every': 0, 'idle_preview_size': (320, 180)},
+    {'name': 'motion-minimal-preview-reduced', 'motion_every': 12, 'preview_every': 4, 'idle_preview_every': 0, 'idle_preview_size': (320, 180)},
+]
+
+class LoadGovernor:
+    """Следит за задержкой event loop и CPU-временем процесса, при перегрузке поэтапно
+    снижает частоту превью и анализа движения. Время этапов process_camera_stream (wall clock,
+    включая ожидание кадра в cap.read) только отображается в stage_ms."""
+    def __init__(self):
+        self.level = 0
+        self.loop_lag = 0.0  # EWMA, секунды
+        self.utilization = 0.0
+        self.stage_busy: Dict[str, float] = defaultdict(float)  # Wall-время этапов за текущий интервал
+        self.stage_calls: Dict[str, int] = defaultdict(int)
+        self.stage_ms: Dict[str, float] = {}  # Среднее время этапа за прошлый интервал
+        self.pressure_count = 0
+        self.calm_count = 0
+        self.cpu_count = os.cpu_count() or 1
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+    
+    def record(self, stage: str, seconds: float):
+        self.stage_busy[stage] += seconds
+        self.stage_calls[stage] += 1
+    
+    def policy(self) -> dict:
+        return GOVERNOR_LEVELS[self.level]
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            cpu_started = time.process_time()
+            await asyncio.sleep(GOVERNOR_INTERVAL)
+            elapsed = loop.time() - started
+            lag = max(elapsed - GOVERNOR_INTERVAL, 0.0)
+            self.loop_lag = 0.7 * self.loop_lag + 0.3 * lag
+            
+            # CPU всех потоков процесса (event loop и to_thread-этапы); блокировка в cap.read не считается
+            self.utilization = (time.process_time() - cpu_started) / elapsed / self.cpu_count
+            self.stage_ms = {
+                stage: busy * 1000 / self.stage_calls[stage]
+                for stage, busy in self.stage_busy.items() if self.stage_calls[stage]
+            }
+            self.stage_busy.clear()
+            self.stage_calls.clear()
+            
+            self.adjust()
+    
+    def adjust(self):
+        if self.loop_lag > GOVERNOR_LAG_HIGH or self.utilization > GOVERNOR_UTIL_HIGH:
+            self.pressure_count += 1
+            self.calm_count = 0
+        elif self.loop_lag < GOVERNOR_LAG_LOW and self.utilization < GOVERNOR_UTIL_LOW:
+            self.calm_count += 1
+            self.pressure_count = 0
+        else:
+            self.pressure_count = 0
+            self.calm_count = 0
+        
+        if self.pressure_count >= GOVERNOR_ESCALATE_AFTER and self.level < len(GOVERNOR_LEVELS) - 1:
+            self.level += 1
+            self.pressure_count = 0
+            logger.warning(
+                f"Governor: load shedding level {self.level} ({GOVERNOR_LEVELS[self.level]['name']}), "
+                f"loop lag {self.loop_lag * 1000:.0f}ms, utilization {self.utilization:.0%}"
+            )
+        elif self.calm_count >= GOVERNOR_RECOVER_AFTER and self.level > 0:
+            self.level -= 1
+            self.calm_count = 0
+            logger.info(f"Governor: recovered to level {self.level} ({GOVERNOR_LEVELS[self.level]['name']})")
+    
+    def state(self) -> dict:
+        return {
+            "level": self.level,
+            "level_name": GOVERNOR_LEVELS[self.level]['name'],
+            "max_level": len(GOVERNOR_LEVELS) - 1,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "utilization": round(self.utilization, 3),
+            "cpu_count": self.cpu_count,
+            "stage_ms": {stage: round(ms, 2) for stage, ms in self.stage_ms.items()},
+            "policy": {k: v for k, v in self.policy().items() if k != 'name'}
+        }
+
+governor = LoadGovernor()
+
+# Live H.264 через fMP4/MSE (ремукс ffmpeg без декодирования)
+mse_manager = MSEManager()
+
+def is_hevc_codec(codec: Optional[str]) -> bool:
+    codec = (codec or '').lower()
+    return any(tag in codec for tag in ('hev', 'hvc', '265'))
+
+def count_viewers(camera_id: str) -> int:
+    """Зрители live-потока камеры в этом процессе (JPEG и MSE)"""
+    return ws_manager.viewer_count(camera_id) + mse_manager.viewer_count(camera_id)
+
+# Снимок списка камер для GET /api/cameras (дашборд опрашивает его постоянно)
+class CameraListCache:
+    def __init__(self):
+        self.cameras: Optional[List[dict]] = None  # JSON-готовые документы камер без живых полей
+        self.snapshot_id = 0
+        self.loaded_at = 0.0
+        self.generation = 0  # Растет при каждом сбросе, чтобы не сохранить снимок, устаревший во время загрузки
+        self.lock = asyncio.Lock()
+        self.body_key = None
+        self.body = b''
+        self.etag = ''
+    
+    def invalidate(self):
+        self.generation += 1
+        self.cameras = None
+    
+    async def snapshot(self) -> Tuple[int, List[dict]]:
+        async with self.lock:
+            if self.cameras is not None and time.monotonic() - self.loaded_at < CAMERA_LIST_MAX_AGE:
+                return self.snapshot_id, self.cameras
+            
+            generation = self.generation
+            docs = await db.cameras.find({}, {"_id": 0}).to_list(1000)
+            # Pydantic-валидация и сериализация дат - один раз на снимок, а не на каждый запрос
+            cameras = [Camera(**doc).model_dump(mode='json', exclude=LIVE_CAMERA_FIELDS) for doc in docs]
+            self.snapshot_id += 1
+            if generation == self.generation:
+                self.cameras = cameras
+                self.loaded_at = time.monotonic()
+            return self.snapshot_id, cameras
+    
+    @staticmethod
+    def live_fields(camera: dict, live: dict) -> dict:
+        state = live.get(camera['id'])
+        if state is not None:
+            status = 'recording' if state['recording'] else 'active'
+        elif camera['status'] in ('active', 'recording') and not cluster_manager:
+            status = 'inactive'  # Статус в БД остался от остановленного процесса
+        else:
+            status = camera['status']
+        return {
+            "status": status,
+            "measured_fps": state.get('measured_fps') if state else None,
+            "viewers": count_viewers(camera['id'])
+        }
+    
+    @staticmethod
+    async def engine_status() -> dict:
+        """Состояние камер движка; без движка камеры считаются неактивными"""
+        try:
+            return await camera_engine.status()
+        except (RuntimeError, OSError) as e:
+            logger.warning(f"Camera engine status unavailable: {e}")
+            return {}
+    
+    async def render(self) -> Tuple[bytes, str]:
+        """JSON-тело списка и ETag; тело пересобирается только при изменении снимка или живых полей"""
+        snapshot_id, cameras = await self.snapshot()
+        live = await self.engine_status()
+        overlay = [self.live_fields(camera, live) for camera in cameras]
+        key = (snapshot_id, overlay)
+        if key != self.body_key:
+            self.body = json.dumps(
+                [{**camera, **fields} for camera, fields in zip(cameras, overlay)],
+                separators=(',', ':')
+            ).encode()
+            self.etag = f'"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+            self.body_key = key
+        return self.body, self.etag
+
+camera_list_cache = CameraListCache()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+# Cluster Manager - распределение камер между узлами
+class ClusterManager:
+    """Захват камер через lease-документы с heartbeat и TTL.
+
+    camera_leases: {_id: camera_id, node_id, expires_at}
+    cluster_nodes: {_id: node_id, url, heartbeat_at, expires_at, cameras}
+    expires_at хранится как BSON datetime, иначе TTL-индекс MongoDB не работает.
+    """
+    def __init__(self, node_id: str, node_url: str):
+        self.node_id = node_id
+        self.node_url = node_url.rstrip('/')
+        self.owned: set = set()  # camera_id, на которые у узла есть lease
+        self.starting: Dict[str, asyncio.Task] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+    
+    async def start(self):
+        await db.camera_leases.create_index("expires_at", expireAfterSeconds=0)
+        await db.cluster_nodes.create_index("expires_at", expireAfterSeconds=0)
+        self.task = asyncio.create_task(self.run())
+        logger.info(f"Cluster mode enabled: node {self.node_id} at {self.node_url}")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        for task in self.starting.values():
+            task.cancel()
+        for camera_id in list(self.owned):
+            await self.release(camera_id)
+        await db.cluster_nodes.delete_one({"_id": self.node_id})
+    
+    def wake(self):
+        """Внеочередной цикл распределения (после start/stop камеры)"""
+        self.wakeup.set()
+    
+    async def run(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cluster heartbeat failed on node {self.node_id}: {e}", exc_info=True)
+            
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=CLUSTER_HEARTBEAT)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+    
+    async def tick(self):
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=CLUSTER_LEASE_TTL)
+        
+        await db.cluster_nodes.update_one(
+            {"_id": self.node_id},
+            {"$set": {
+                "url": self.node_url,
+                "heartbeat_at": now,
+                "expires_at": expires_at,
+                "cameras": len(self.owned)
+            }},
+            upsert=True
+        )
+        
+        # Продлеваем свои lease; потерянные (истекшие и захваченные другим узлом) отпускаем
+        for camera_id in list(self.owned):
+            result = await db.camera_leases.update_one(
+                {"_id": camera_id, "node_id": self.node_id},
+                {"$set": {"expires_at": expires_at}}
+            )
+            if result.matched_count == 0:
+                logger.warning(f"Node {self.node_id} lost lease for camera {camera_id}")
+                await self.release(camera_id, delete_lease=False)
+        
+        enabled = {doc['id'] for doc in await db.cameras.find({"enabled": True}, {"id": 1}).to_list(None)}
+        nodes = await db.cluster_nodes.count_documents({"expires_at": {"$gt": now}})
+        fair_share = math.ceil(len(enabled) / max(nodes, 1))
+        
+        # Отключенные или удаленные камеры
+        for camera_id in list(self.owned - enabled):
+            await self.release(camera_id)
+        
+        # Ребалансировка: при появлении новых узлов отдаем лишние камеры
+        excess = len(self.owned) - fair_share
+        if excess > 0:
+            for camera_id in sorted(self.owned)[:excess]:
+                logger.info(f"Node {self.node_id} releasing camera {camera_id} for rebalancing")
+                await self.release(camera_id)
+        
+        # Забираем свободные камеры и камеры с истекшими lease (узел упал)
+        for camera_id in sorted(enabled - self.owned):
+            if len(self.owned) >= fair_share:
+                break
+            if await self.claim(camera_id, now, expires_at):
+                logger.info(f"Node {self.node_id} claimed camera {camera_id}")
+                self.owned.add(camera_id)
+        
+        # Запускаем (и перезапускаем после сбоев) свои камеры, не блокируя heartbeat
+        for camera_id in self.owned:
+            cam_data = camera_manager.active_cameras.get(camera_id)
+            running = cam_data is not None and cam_data['task'] is not None
+            if not running and camera_id not in self.starting:
+                task = asyncio.create_task(self.start_owned_camera(camera_id))
+                self.starting[camera_id] = task
+                task.add_done_callback(lambda _, cid=camera_id: self.starting.pop(cid, None))
+    
+    async def claim(self, camera_id: str, now: datetime, expires_at: datetime) -> bool:
+        """Атомарный захват: upsert срабатывает, только если lease нет или он истек"""
+        try:
+            await db.camera_leases.update_one(
+                {"_id": camera_id, "expires_at": {"$lt": now}},
+                {"$set": {"node_id": self.node_id, "expires_at": expires_at}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    async def release(self, camera_id: str, delete_lease: bool = True):
+        self.owned.discard(camera_id)
+        task = self.starting.pop(camera_id, None)
+        if task:
+            task.cancel()
+        await camera_manager.disconnect_camera(camera_id)
+        if delete_lease:
+            await db.camera_leases.delete_one({"_id": camera_id, "node_id": self.node_id})
+    
+    async def start_owned_camera(self, camera_id: str):
+        camera = await db.cameras.find_one({"id": camera_id}, {"_id": 0})
+        if camera and camera_id in self.owned:
+            await start_camera_pipeline(camera)
+    
+    async def owner_url(self, camera_id: str) -> Optional[str]:
+        """URL узла-владельца камеры или None, если камера локальная/никем не захвачена"""
+        lease = await db.camera_leases.find_one(
+            {"_id": camera_id, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        if not lease or lease['node_id'] == self.node_id:
+            return None
+        node = await db.cluster_nodes.find_one({"_id": lease['node_id']}, {"url": 1})
+        return node['url'] if node else None
+
+cluster_manager = ClusterManager(NODE_ID, NODE_URL) if CLUSTER_MODE else None
+
+async def route_to_owner(camera_id: str, request: Request) -> Optional[RedirectResponse]:
+    """В cluster mode перенаправляет запрос к чужой камере на узел-владелец"""
+    if not cluster_manager or await camera_engine.is_active(camera_id):
+        return None
+    owner = await cluster_manager.owner_url(camera_id)
+    if not owner:
+        return None
+    url = owner + request.url.path
+    if request.url.query:
+        url += '?' + request.url.query
+    # 307 сохраняет метод и тело запроса
+    return RedirectResponse(url=url, status_code=307)
+
+async def proxy_websocket(websocket: WebSocket, target_url: str):
+    """Проксирует WebSocket клиента на узел-владелец камеры"""
+    await websocket.accept()
+    try:
+        async with websockets.connect(target_url, max_size=None) as upstream:
+            async def to_client():
+                async for message in upstream:
+                    if isinstance(message, bytes):
+                        await websocket.send_bytes(message)
+                    else:
+                        await websocket.send_text(message)
+            
+            async def to_upstream():
+                while True:
+                    await upstream.send(await websocket.receive_text())
+            
+            tasks = [asyncio.create_task(to_client()), asyncio.create_task(to_upstream())]
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+    except (WebSocketDisconnect, websockets.ConnectionClosed):
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket proxy to {target_url} failed: {e}")
+    finally:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+# Разрешение кадра для анализа движения (MOG2)
+MOTION_FRAME_SIZE = (320, 180)
+# Пауза без движения, после которой событие считается завершенным
+MOTION_EVENT_GAP_SEC = 2.0
+# Тепловая карта движения сохраняется в коллекцию motion_heatmaps с этим периодом (и при отключении камеры)
+HEATMAP_SAVE_INTERVAL = 60.0
+
+def build_zone_masks(zones: list, frame_shape: tuple) -> List[Tuple[str, np.ndarray]]:
+    """Растеризует motion_zones в маски разрешения анализа"""
+    scale_x = MOTION_FRAME_SIZE[0] / frame_shape[1]
+    scale_y = MOTION_FRAME_SIZE[1] / frame_shape[0]
+    masks = []
+    for zone in zones:
+        if not zone.get('points'):
+            continue
+        mask = np.zeros((MOTION_FRAME_SIZE[1], MOTION_FRAME_SIZE[0]), dtype=np.uint8)
+        pts = np.array([
+            [int(p[0] * scale_x), int(p[1] * scale_y)]
+            for p in zone['points']
+        ], dtype=np.int32)
+        cv2.fillPoly(mask, [pts], 255)
+        masks.append((zone.get('name', ''), mask))
+    return masks
+
+def motion_bbox(fg_mask: np.ndarray, min_contour_area: float) -> Optional[Tuple[int, int, int, int]]:
+    """Объединенный bounding box контуров MOG2 как (x1, y1, x2, y2)"""
+    contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    box = None
+    for contour in contours:
+        if cv2.contourArea(contour) < min_contour_area:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        if box is None:
+            box = (x, y, x + w, y + h)
+        else:
+            box = (min(box[0], x), min(box[1], y), max(box[2], x + w), max(box[3], y + h))
+    return box
+
+async def save_motion_event(camera_id: str, camera_name: str, event: dict, frame_shape: tuple):
+    """Сохраняет завершенное событие движения в коллекцию motion_events и публикует motion.end"""
+    event_bus.publish(
+        'motion.end', camera_id,
+        duration=round((event['end_time'] - event['start_time']).total_seconds(), 1),
+        peak_pixels=event['peak_pixels'], zones=sorted(event['zones'])
+    )
+    bbox = None
+    if event['bbox']:
+        # Переводим bbox из координат анализа в координаты кадра камеры
+        scale_x = frame_shape[1] / MOTION_FRAME_SIZE[0]
+        scale_y = frame_shape[0] / MOTION_FRAME_SIZE[1]
+        x1, y1, x2, y2 = event['bbox']
+        bbox = (int(x1 * scale_x), int(y1 * scale_y), int((x2 - x1) * scale_x), int((y2 - y1) * scale_y))
+    
+    motion_event = MotionEvent(
+        camera_id=camera_id,
+        camera_name=camera_name,
+        recording_id=event['recording_id'],
+        start_time=event['start_time'],
+        end_time=event['end_time'],
+        bbox=bbox,
+        peak_pixels=event['peak_pixels'],
+        zones=sorted(event['zones'])
+    )
+    doc = motion_event.model_dump()
+    doc['start_time'] = doc['start_time'].isoformat()
+    doc['end_time'] = doc['end_time'].isoformat()
+    try:
+        await db.motion_events.insert_one(doc)
+    except Exception as e:
+        logger.error(f"Failed to save motion event for camera {camera_id}: {e}")
+
+async def load_motion_heatmap(camera_id: str) -> MotionHeatmap:
+    """Сохраненная тепловая карта камеры (с затуханием за время простоя) или пустая"""
+    try:
+        doc = await db.motion_heatmaps.find_one({"_id": camera_id})
+        if doc and (doc['width'], doc['height']) == MOTION_FRAME_SIZE:
+            return MotionHeatmap.from_document(doc, time.time())
+    except Exception as e:
+        logger.error(f"Failed to load motion heatmap for camera {camera_id}: {e}")
+    return MotionHeatmap(*MOTION_FRAME_SIZE)
+
+async def save_motion_heatmap(camera_id: str, heatmap: MotionHeatmap):
+    if heatmap.updated_at is None:
+        return
+    try:
+        await db.motion_heatmaps.replace_one({"_id": camera_id}, heatmap.to_document(), upsert=True)
+    except Exception as e:
+        logger.error(f"Failed to save motion heatmap for camera {camera_id}: {e}")
+
 # Background task for processing camera stream
 async def process_camera_stream(camera_id: str):
     consecutive_failures = 0
@@ -320,6 +1415,14 @@ async def process_camera_stream(camera_id: str):
     motion_buffer = []  # Буфер для предзаписи
     motion_detected_time = None
     is_recording = False
+    motion_event = None  # Текущее (незавершенное) событие движения
+    zone_masks = []
+    zone_masks_key = None
+    frame_shape = None
+    camera_name = 'Camera'
+    fps_frames = 0
+    fps_window_start = time.monotonic()
+    heatmap_saved = time.monotonic()
     
     while camera_id in camera_manager.active_cameras:
         try:
@@ -328,12 +1431,21 @@ async def process_camera_stream(camera_id: str):
             mog2 = cam_data['mog2']
             recording = cam_data['recording']
             codec = cam_data.get('codec', 'unknown')
+            # Замеры шагов только во время профилирования (/api/admin/cameras/{id}/profile)
+            profiler = cam_data.get('profiler') or NULL_PROFILER
+            iteration_start = time.perf_counter()
             
-            # Получаем настройки камеры
-            camera_doc = await db.cameras.find_one(
-                {"id": camera_id}, 
-                {"motion_settings": 1, "exclusion_zones": 1, "fps": 1}
-            )
+            # Получаем настройки камеры (из кэша, БД читаем только при изменении или раз в SETTINGS_REFRESH_SEC)
+            with profiler.step('settings'):
+                camera_doc = cam_data.get('settings')
+                loop_time = asyncio.get_running_loop().time()
+                if camera_doc is None or loop_time - cam_data.get('settings_time', 0.0) > SETTINGS_REFRESH_SEC:
+                    camera_doc = await db.cameras.find_one(
+                        {"id": camera_id}, 
+                        {"name": 1, "motion_settings": 1, "exclusion_zones": 1, "motion_zones": 1, "fps": 1}
+                    )
+                    cam_data['settings'] = camera_doc
+                    cam_data['settings_time'] = loop_time
             
             motion_settings = camera_doc.get('motion_settings', {}) if camera_doc else {}
             motion_enabled = motion_settings.get('enabled', True)
@@ -342,17 +1454,23 @@ async def process_camera_stream(camera_id: str):
             pre_record_sec = motion_settings.get('pre_record', 5)
             post_record_sec = motion_settings.get('post_record', 10)
             exclusion_zones = camera_doc.get('exclusion_zones', []) if camera_doc else []
+            motion_zones = camera_doc.get('motion_zones', []) if camera_doc else []
             camera_fps = camera_doc.get('fps', 25.0) if camera_doc else 25.0
+            camera_name = camera_doc.get('name', 'Camera') if camera_doc else 'Camera'
             
             # Расчет размера буфера предзаписи
             buffer_size = int(camera_fps * pre_record_sec)
             
             # Read frame
-            ret, frame = await asyncio.to_thread(cap.read)
+            stage_start = time.perf_counter()
+            ret, frame = await profiler.to_thread('read', cap.read)
+            governor.record('read', time.perf_counter() - stage_start)
             
             if not ret or frame is None:
                 consecutive_failures += 1
                 logger.warning(f"Failed to read frame from camera {camera_id} (attempt {consecutive_failures}/{max_failures})")
+                if consecutive_failures == 1:
+                    event_bus.publish('camera.error', camera_id, error="Frame read failed")
                 
                 if consecutive_failures >= max_failures:
                     logger.error(f"Too many consecutive failures for camera {camera_id}, stopping stream")
@@ -363,37 +1481,58 @@ async def process_camera_stream(camera_id: str):
                 continue
             
             # Reset failure counter on successful read
+            if consecutive_failures:
+                # Поток восстановился (FFmpeg переподключился к камере)
+                event_bus.publish('camera.reconnected', camera_id, failures=consecutive_failures)
             consecutive_failures = 0
             frame_counter += 1
             
+            # Фактический fps для списка камер (GET /api/cameras)
+            fps_frames += 1
+            fps_now = time.monotonic()
+            if fps_now - fps_window_start >= MEASURED_FPS_WINDOW:
+                cam_data['measured_fps'] = round(fps_frames / (fps_now - fps_window_start), 1)
+                fps_frames = 0
+                fps_window_start = fps_now
+            
             # Verify frame is not empty
             if frame.size == 0:
                 logger.warning(f"Empty frame from camera {camera_id}")
                 await asyncio.sleep(0.1)
                 continue
             
-            # Оптимизация: обрабатываем MOG2 только каждый 3-й кадр для снижения CPU
-            process_motion = (frame_counter % 3 == 0) and motion_enabled
+            frame_shape = frame.shape
+            
+            # Оптимизация: MOG2 не на каждом кадре (частоту снижает governor под нагрузкой)
+            policy = governor.policy()
+            process_motion = (frame_counter % policy['motion_every'] == 0) and motion_enabled
             motion_detected = False
             
             if process_motion:
+                stage_start = time.perf_counter()
                 # Уменьшаем кадр для MOG2 (снижение CPU)
-                small_frame_mog = cv2.resize(frame, (320, 180))
+                with profiler.step('resize'):
+                    small_frame_mog = cv2.resize(frame, MOTION_FRAME_SIZE)
                 
                 # Apply MOG2 с настройками чувствительности
-                fg_mask = await asyncio.to_thread(
-                    mog2.apply, small_frame_mog, 
+                fg_mask = await profiler.to_thread(
+                    'mog2', mog2.apply, small_frame_mog, 
                     learningRate=sensitivity / 1000.0
                 )
                 
+                # Тепловая карта - по маске до зон исключения, чтобы было видно, что они отсекают
+                with profiler.step('heatmap'):
+                    cam_data['heatmap'].update(fg_mask, time.time())
+                
+                mask_start = time.perf_counter()
                 # Apply exclusion zones
                 if exclusion_zones:
                     mask = np.ones(fg_mask.shape, dtype=np.uint8) * 255
                     for zone in exclusion_zones:
                         if zone.get('points'):
                             # Масштабируем координаты зон под размер small_frame
-                            scale_x = 320 / frame.shape[1]
-                            scale_y = 180 / frame.shape[0]
+                            scale_x = MOTION_FRAME_SIZE[0] / frame.shape[1]
+                            scale_y = MOTION_FRAME_SIZE[1] / frame.shape[0]
                             pts = np.array([
                                 [int(p[0] * scale_x), int(p[1] * scale_y)] 
                                 for p in zone['points']
@@ -406,10 +1545,53 @@ async def process_camera_stream(camera_id: str):
                 if motion_pixels > (min_area / 10):  # Скейлинг для уменьшенного кадра
                     motion_detected = True
                     motion_detected_time = datetime.now(timezone.utc)
+                    
+                    # Маски motion_zones пересчитываем только при изменении зон
+                    key = (json.dumps(motion_zones, sort_keys=True), frame.shape[:2])
+                    if key != zone_masks_key:
+                        zone_masks = build_zone_masks(motion_zones, frame.shape)
+                        zone_masks_key = key
+                    
+                    # Обновляем индекс события: bbox, пик и попадания в зоны
+                    if motion_event is None:
+                        motion_event = {
+                            'start_time': motion_detected_time,
+                            'end_time': motion_detected_time,
+                            'recording_id': recording['id'] if recording else None,
+                            'bbox': None,
+                            'peak_pixels': 0,
+                            'zones': set()
+                        }
+                        event_bus.publish('motion.start', camera_id, pixels=motion_pixels)
+                    motion_event['end_time'] = motion_detected_time
+                    motion_event['peak_pixels'] = max(motion_event['peak_pixels'], motion_pixels)
+                    box = motion_bbox(fg_mask, min_area / 100)
+                    if box:
+                        prev = motion_event['bbox']
+                        motion_event['bbox'] = box if prev is None else (
+                            min(prev[0], box[0]), min(prev[1], box[1]),
+                            max(prev[2], box[2]), max(prev[3], box[3])
+                        )
+                    for zone_name, zone_mask in zone_masks:
+                        if zone_name not in motion_event['zones'] and cv2.countNonZero(cv2.bitwise_and(fg_mask, zone_mask)) > 0:
+                            motion_event['zones'].add(zone_name)
+                
+                profiler.record('mask', time.perf_counter() - mask_start)
+                governor.record('motion', time.perf_counter() - stage_start)
+            
+            if time.monotonic() - heatmap_saved > HEATMAP_SAVE_INTERVAL:
+                heatmap_saved = time.monotonic()
+                await save_motion_heatmap(camera_id, cam_data['heatmap'])
+            
+            # Завершаем событие после паузы без движения
+            if motion_event and (datetime.now(timezone.utc) - motion_event['end_time']).total_seconds() > MOTION_EVENT_GAP_SEC:
+                await save_motion_event(camera_id, camera_name, motion_event, frame_shape)
+                motion_event = None
             
             # Управление буфером предзаписи
             if motion_enabled:
-                motion_buffer.append(frame.copy())
+                with profiler.step('buffer_copy'):
+                    motion_buffer.append(frame.copy())
                 if len(motion_buffer) > buffer_size:
                     motion_buffer.pop(0)
             
@@ -417,13 +1599,15 @@ async def process_camera_stream(camera_id: str):
             if motion_enabled and not recording:
                 if motion_detected:
                     # Начать запись с предзаписью
-                    recording_id = await camera_manager.start_recording(camera_id, camera_doc.get('name', 'Camera'))
+                    recording_id = await camera_manager.start_recording(camera_id, camera_name)
                     if recording_id:
                         recording = camera_manager.active_cameras[camera_id]['recording']
+                        if motion_event and not motion_event['recording_id']:
+                            motion_event['recording_id'] = recording_id
                         # Записываем буфер предзаписи
                         for buffered_frame in motion_buffer:
                             if recording and recording['writer']:
-                                await asyncio.to_thread(recording['writer'].write, buffered_frame)
+                                await profiler.to_thread('writer', recording['writer'].write, buffered_frame)
                         is_recording = True
                         logger.info(f"Motion detected on camera {camera_id}, started recording with {len(motion_buffer)} pre-record frames")
             
@@ -437,30 +1621,43 @@ async def process_camera_stream(camera_id: str):
                     motion_detected_time = None
                     logger.info(f"No motion for {post_record_sec}s on camera {camera_id}, stopped recording")
             
-            # Write to recording if active
+            # Write to recording if active (governor запись не ограничивает)
             if recording and recording['writer']:
-                await asyncio.to_thread(recording['writer'].write, frame)
+                stage_start = time.perf_counter()
+                await profiler.to_thread('writer', recording['writer'].write, frame)
+                governor.record('write', time.perf_counter() - stage_start)
                 if motion_detected:
                     recording['motion_events'] += 1
             
-            # Encode frame for WebSocket - только каждый 2-й кадр для снижения CPU
-            if frame_counter % 2 == 0:
+            # Encode frame for WebSocket - не каждый кадр; для камер без зрителей governor снижает fps и размер
+            if ws_manager.has_viewers(camera_id):
+                preview_every, preview_size = policy['preview_every'], (640, 360)
+            else:
+                preview_every, preview_size = policy['idle_preview_every'], policy['idle_preview_size']
+            if preview_every and frame_counter % preview_every == 0:
+                stage_start = time.perf_counter()
                 # Resize для streaming (снижение CPU и bandwidth)
-                small_frame = cv2.resize(frame, (640, 360))
+                with profiler.step('resize'):
+                    small_frame = cv2.resize(frame, preview_size)
                 
                 # Encode to JPEG with quality 60 для снижения CPU
-                encode_success, buffer = await asyncio.to_thread(
-                    cv2.imencode, '.jpg', small_frame, 
+                encode_success, buffer = await profiler.to_thread(
+                    'encode', cv2.imencode, '.jpg', small_frame, 
                     [cv2.IMWRITE_JPEG_QUALITY, 60]
                 )
                 
                 if encode_success and buffer is not None:
                     # Broadcast to WebSocket clients
-                    await ws_manager.broadcast(camera_id, buffer.tobytes())
+                    with profiler.step('broadcast'):
+                        await ws_manager.broadcast(camera_id, buffer.tobytes())
+                governor.record('preview', time.perf_counter() - stage_start)
+            
+            profiler.record('iteration', time.perf_counter() - iteration_start)
             
             # Динамическая задержка в зависимости от FPS камеры
             delay = max(0.05, 1.0 / camera_fps) if camera_fps > 0 else 0.05
-            await asyncio.sleep(delay)
+            with profiler.step('sleep'):
+                await asyncio.sleep(delay)
             
         except asyncio.CancelledError:
             logger.info(f"Stream processing cancelled for camera {camera_id}")
@@ -468,6 +1665,8 @@ async def process_camera_stream(camera_id: str):
         except Exception as e:
             logger.error(f"Error processing camera {camera_id}: {e}", exc_info=True)
             consecutive_failures += 1
+            if consecutive_failures == 1:
+                event_bus.publish('camera.error', camera_id, error=str(e))
             
             if consecutive_failures >= max_failures:
                 logger.error(f"Too many errors for camera {camera_id}, stopping stream")
@@ -475,6 +1674,10 @@ async def process_camera_stream(camera_id: str):
                 break
             
             await asyncio.sleep(1)
+    
+    # Сохраняем незавершенное событие при остановке потока
+    if motion_event and frame_shape:
+        await save_motion_event(camera_id, camera_name, motion_event, frame_shape)
 
 # API Routes
 @api_router.post("/cameras", response_model=Camera)
@@ -486,22 +1689,27 @@ async def create_camera(camera: CameraCreate, background_tasks: BackgroundTasks)
         password=camera.password
     )
     
-    doc = camera_obj.model_dump()
+    doc = camera_obj.model_dump(exclude=LIVE_CAMERA_FIELDS)
     doc['created_at'] = doc['created_at'].isoformat()
     await db.cameras.insert_one(doc)
+    camera_list_cache.invalidate()
     
-    # Connect to camera in background
-    background_tasks.add_task(camera_manager.connect_camera, camera_obj)
+    # Connect to camera in background (в режиме api камерами управляет только движок,
+    # в кластере - узел, захвативший lease, иначе на узле остается VideoCapture без владения)
+    if ENGINE_MODE != 'api' and cluster_manager is None:
+        background_tasks.add_task(camera_manager.connect_camera, camera_obj)
     
     return camera_obj
 
 @api_router.get("/cameras", response_model=List[Camera])
-async def get_cameras():
-    cameras = await db.cameras.find({}, {"_id": 0}).to_list(1000)
-    for cam in cameras:
-        if isinstance(cam.get('created_at'), str):
-            cam['created_at'] = datetime.fromisoformat(cam['created_at'])
-    return cameras
+async def get_cameras(request: Request):
+    """Список камер из снимка в памяти с живыми полями (status, measured_fps, viewers).
+    Клиент с актуальным ETag получает 304 без тела."""
+    body, etag = await camera_list_cache.render()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @api_router.get("/cameras/{camera_id}", response_model=Camera)
 async def get_camera(camera_id: str):
@@ -510,6 +1718,8 @@ async def get_camera(camera_id: str):
         raise HTTPException(status_code=404, detail="Camera not found")
     if isinstance(camera.get('created_at'), str):
         camera['created_at'] = datetime.fromisoformat(camera['created_at'])
+    # Статус, fps и зрители - как в списке камер
+    camera.update(CameraListCache.live_fields(camera, await CameraListCache.engine_status()))
     return camera
 
 @api_router.put("/cameras/{camera_id}", response_model=Camera)
@@ -521,6 +1731,8 @@ async def update_camera(camera_id: str, update: CameraUpdate):
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_data:
         await db.cameras.update_one({"id": camera_id}, {"$set": update_data})
+        camera_list_cache.invalidate()
+        await camera_engine.reload_settings(camera_id)
     
     updated_camera = await db.cameras.find_one({"id": camera_id}, {"_id": 0})
     if isinstance(updated_camera.get('created_at'), str):
@@ -528,88 +1740,224 @@ async def update_camera(camera_id: str, update: CameraUpdate):
     return updated_camera
 
 @api_router.get("/cameras/{camera_id}/snapshot")
-async def get_camera_snapshot(camera_id: str):
+async def get_camera_snapshot(camera_id: str, request: Request):
     """Получить текущий кадр с камеры для редактора зон"""
-    if not camera_manager.is_connected(camera_id):
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    if not await camera_engine.is_active(camera_id):
         raise HTTPException(status_code=400, detail="Camera is not active")
     
     try:
-        cam_data = camera_manager.active_cameras[camera_id]
-        cap = cam_data['cap']
-        
-        # Read current frame
-        ret, frame = await asyncio.to_thread(cap.read)
-        
-        if not ret or frame is None:
-            raise HTTPException(status_code=500, detail="Failed to capture frame")
-        
-        # Encode to JPEG
-        _, buffer = await asyncio.to_thread(
-            cv2.imencode, '.jpg', frame, 
-            [cv2.IMWRITE_JPEG_QUALITY, 85]
-        )
-        
-        return StreamingResponse(
-            iter([buffer.tobytes()]),
-            media_type="image/jpeg"
-        )
-        
+        data = await camera_engine.snapshot(camera_id)
     except Exception as e:
         logger.error(f"Error getting snapshot from camera {camera_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if data is None:
+        raise HTTPException(status_code=400, detail="Camera is not active")
+    
+    return StreamingResponse(
+        iter([data]),
+        media_type="image/jpeg"
+    )
+
+MJPEG_BOUNDARY = 'frame'
+MJPEG_IDLE_TIMEOUT = 10.0  # Секунды без кадров, после которых проверяем, работает ли камера
+
+def mjpeg_part(jpeg: bytes) -> bytes:
+    """Часть multipart/x-mixed-replace с одним JPEG-кадром"""
+    return (
+        f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+        + jpeg + b"\r\n"
+    )
+
+@api_router.get("/cameras/{camera_id}/live.mjpg")
+async def live_mjpeg(camera_id: str, request: Request):
+    """Live-поток MJPEG over HTTP для VLC, Home Assistant и т.п. Кадры те же, что уходят
+    в WebSocket (без отдельного декодирования/кодирования), медленный клиент получает только последний кадр."""
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    if not await camera_engine.is_active(camera_id):
+        raise HTTPException(status_code=400, detail="Camera is not active")
+    
+    async def generate():
+        slot = ws_manager.subscribe_frames(camera_id)
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(slot.get(), timeout=MJPEG_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if not await camera_engine.is_active(camera_id):
+                        break
+                    continue
+                yield mjpeg_part(frame)
+        finally:
+            ws_manager.unsubscribe_frames(camera_id, slot)
+    
+    return StreamingResponse(
+        generate(),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/cameras/{camera_id}/heatmap.png")
+async def get_camera_heatmap(camera_id: str, request: Request):
+    """Тепловая карта движения (RGBA PNG в разрешении анализа) для наложения в редакторе зон"""
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    data = await camera_engine.heatmap(camera_id)
+    if data is None:
+        # Камера не работает - отдаем последнюю сохраненную карту
+        doc = await db.motion_heatmaps.find_one({"_id": camera_id})
+        if not doc:
+            raise HTTPException(status_code=404, detail="No motion heatmap for this camera")
+        data = await asyncio.to_thread(lambda: MotionHeatmap.from_document(doc, time.time()).to_png())
+    
+    return Response(content=data, media_type="image/png", headers={"Cache-Control": "no-cache"})
 
 @api_router.delete("/cameras/{camera_id}")
 async def delete_camera(camera_id: str):
-    await camera_manager.disconnect_camera(camera_id)
+    await camera_engine.stop_camera(camera_id)
     result = await db.cameras.delete_one({"id": camera_id})
+    camera_list_cache.invalidate()
+    await db.motion_heatmaps.delete_one({"_id": camera_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Camera not found")
     return {"message": "Camera deleted"}
 
+async def start_camera_pipeline(camera: dict) -> bool:
+    """Подключает камеру и запускает задачу обработки потока"""
+    camera_id = camera['id']
+    if camera_manager.is_connected(camera_id):
+        # Камера могла быть подключена при создании без задачи обработки
+        cam_data = camera_manager.active_cameras[camera_id]
+        if cam_data['task'] is None:
+            cam_data['task'] = asyncio.create_task(process_camera_stream(camera_id))
+        return True
+    
+    camera_obj = Camera(**{k: v for k, v in camera.items() if k != '_id'})
+    if isinstance(camera_obj.created_at, str):
+        camera_obj.created_at = datetime.fromisoformat(camera_obj.created_at)
+    
+    success = await camera_manager.connect_camera(camera_obj)
+    if not success:
+        return False
+    
+    # Start processing task
+    task = asyncio.create_task(process_camera_stream(camera_id))
+    camera_manager.active_cameras[camera_id]['task'] = task
+    return True
+
+class LocalEngine:
+    """Движок камер в процессе API (ENGINE_MODE=embedded). Интерфейс совпадает с EngineClient."""
+    async def start_camera(self, camera_id: str) -> bool:
+        camera = await db.cameras.find_one({"id": camera_id}, {"_id": 0})
+        return bool(camera) and await start_camera_pipeline(camera)
+    
+    async def stop_camera(self, camera_id: str):
+        await camera_manager.disconnect_camera(camera_id)
+    
+    async def start_recording(self, camera_id: str, camera_name: str) -> Optional[str]:
+        return await camera_manager.start_recording(camera_id, camera_name)
+    
+    async def stop_recording(self, camera_id: str):
+        await camera_manager.stop_recording(camera_id)
+    
+    async def snapshot(self, camera_id: str) -> Optional[bytes]:
+        return await camera_manager.snapshot(camera_id)
+    
+    async def reload_settings(self, camera_id: str):
+        camera_manager.reload_settings(camera_id)
+    
+    async def heatmap(self, camera_id: str) -> Optional[bytes]:
+        return await camera_manager.heatmap_png(camera_id)
+    
+    async def is_active(self, camera_id: str) -> bool:
+        return camera_manager.is_connected(camera_id)
+    
+    async def status(self) -> dict:
+        return {
+            camera_id: {"recording": cam_data['recording'] is not None, "measured_fps": cam_data['measured_fps']}
+            for camera_id, cam_data in camera_manager.active_cameras.items()
+        }
+    
+    async def governor_state(self) -> dict:
+        return governor.state()
+    
+    async def profile(self, camera_id: str, duration: float, stack: bool) -> Optional[dict]:
+        return await camera_manager.profile(camera_id, duration, stack)
+
+camera_engine = EngineClient(ENGINE_SOCKET) if ENGINE_MODE == 'api' else LocalEngine()
+
 @api_router.post("/cameras/{camera_id}/start")
 async def start_camera(camera_id: str):
     camera = await db.cameras.find_one({"id": camera_id})
     if not camera:
         raise HTTPException(status_code=404, detail="Camera not found")
     
-    if not camera_manager.is_connected(camera_id):
-        camera_obj = Camera(**{k: v for k, v in camera.items() if k != '_id'})
-        if isinstance(camera_obj.created_at, str):
-            camera_obj.created_at = datetime.fromisoformat(camera_obj.created_at)
-        
-        success = await camera_manager.connect_camera(camera_obj)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to connect to camera")
-        
-        # Start processing task
-        task = asyncio.create_task(process_camera_stream(camera_id))
-        camera_manager.active_cameras[camera_id]['task'] = task
+    await db.cameras.update_one({"id": camera_id}, {"$set": {"enabled": True}})
+    camera_list_cache.invalidate()
+    
+    if cluster_manager:
+        # Камеру запустит узел, который захватит ее lease
+        cluster_manager.wake()
+        return {"message": "Camera scheduled", "status": "pending"}
+    
+    success = await camera_engine.start_camera(camera_id)
+    # В режиме api камеру подключает движок: codec/resolution в БД обновил другой процесс
+    camera_list_cache.invalidate()
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to connect to camera")
     
     return {"message": "Camera started", "status": "active"}
 
 @api_router.post("/cameras/{camera_id}/stop")
 async def stop_camera(camera_id: str):
-    await camera_manager.disconnect_camera(camera_id)
+    await db.cameras.update_one({"id": camera_id}, {"$set": {"enabled": False}})
+    camera_list_cache.invalidate()
+    
+    if cluster_manager:
+        # Узел-владелец остановит камеру на ближайшем heartbeat
+        if camera_id in cluster_manager.owned:
+            await cluster_manager.release(camera_id)
+        cluster_manager.wake()
+        return {"message": "Camera stopped", "status": "inactive"}
+    
+    await camera_engine.stop_camera(camera_id)
     return {"message": "Camera stopped", "status": "inactive"}
 
 @api_router.post("/cameras/{camera_id}/record/start")
-async def start_recording(camera_id: str):
+async def start_recording(camera_id: str, request: Request):
     camera = await db.cameras.find_one({"id": camera_id})
     if not camera:
         raise HTTPException(status_code=404, detail="Camera not found")
     
-    if not camera_manager.is_connected(camera_id):
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    if not await camera_engine.is_active(camera_id):
         raise HTTPException(status_code=400, detail="Camera is not active")
     
-    recording_id = await camera_manager.start_recording(camera_id, camera['name'])
+    recording_id = await camera_engine.start_recording(camera_id, camera['name'])
     if not recording_id:
         raise HTTPException(status_code=500, detail="Failed to start recording")
     
     return {"message": "Recording started", "recording_id": recording_id}
 
 @api_router.post("/cameras/{camera_id}/record/stop")
-async def stop_recording_endpoint(camera_id: str):
-    await camera_manager.stop_recording(camera_id)
+async def stop_recording_endpoint(camera_id: str, request: Request):
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    await camera_engine.stop_recording(camera_id)
     return {"message": "Recording stopped"}
 
 @api_router.get("/recordings", response_model=List[Recording])
@@ -637,6 +1985,26 @@ async def download_recording(recording_id: str):
     
     return FileResponse(filepath, media_type="video/x-msvideo", filename=recording['filename'])
 
+async def get_preview_file(recording_id: str, index: int) -> FileResponse:
+    recording = await db.recordings.find_one({"id": recording_id}, {"filename": 1})
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    
+    filepath = previews.preview_paths(RECORDINGS_DIR / recording['filename'])[index]
+    if not filepath.exists():
+        raise HTTPException(status_code=404, detail="Preview not found")
+    
+    # Превью неизменны для завершенной записи - кэшируем в браузере надолго
+    return FileResponse(filepath, media_type="image/jpeg", headers={"Cache-Control": PREVIEW_CACHE_CONTROL})
+
+@api_router.get("/recordings/{recording_id}/poster")
+async def get_recording_poster(recording_id: str):
+    return await get_preview_file(recording_id, 0)
+
+@api_router.get("/recordings/{recording_id}/sprite")
+async def get_recording_sprite(recording_id: str):
+    return await get_preview_file(recording_id, 1)
+
 @api_router.get("/recordings/{recording_id}/stream")
 async def stream_recording(recording_id: str, speed: float = 1.0):
     recording = await db.recordings.find_one({"id": recording_id})
@@ -662,17 +2030,138 @@ async def stream_recording(recording_id: str, speed: float = 1.0):
             
             # Encode frame
             _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            yield buffer.tobytes()
+            yield mjpeg_part(buffer.tobytes())
             
             await asyncio.sleep(delay)
         
         cap.release()
     
-    return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
+    return StreamingResponse(generate(), media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+
+@api_router.get("/motion-events", response_model=List[MotionEvent])
+async def get_motion_events(
+    camera_id: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    zone: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """События движения по камерам, диапазону времени начала и зоне"""
+    query = {}
+    if camera_id:
+        query['camera_id'] = {"$in": camera_id}
+    if zone:
+        query['zones'] = zone
+    time_range = {}
+    # Время хранится как ISO-строка в UTC, поэтому сравнение строк = сравнение времени
+    if start:
+        time_range['$gte'] = to_utc_iso(start)
+    if end:
+        time_range['$lte'] = to_utc_iso(end)
+    if time_range:
+        query['start_time'] = time_range
+    
+    events = await db.motion_events.find(query, {"_id": 0}).sort("start_time", 1).to_list(limit)
+    
+    for event in events:
+        event['start_time'] = datetime.fromisoformat(event['start_time'])
+        event['end_time'] = datetime.fromisoformat(event['end_time'])
+    
+    return events
+
+@api_router.get("/stats/cameras", response_model=CameraStats)
+async def get_camera_stats(
+    camera_id: Optional[List[str]] = Query(None),
+    start: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$'),
+    end: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$')
+):
+    """Записи, длительность, объем и движение по камерам и дням (UTC) из дневных сводок,
+    без чтения коллекции recordings"""
+    query = {}
+    if camera_id:
+        query['camera_id'] = {"$in": camera_id}
+    date_range = {}
+    if start:
+        date_range['$gte'] = start
+    if end:
+        date_range['$lte'] = end
+    if date_range:
+        query['date'] = date_range
+    
+    days = await db.camera_daily_stats.find(query, {"_id": 0}).sort([("date", 1), ("camera_id", 1)]).to_list(None)
+    
+    totals: Dict[str, dict] = {}
+    for day in days:
+        total = totals.setdefault(day['camera_id'], {
+            "camera_id": day['camera_id'], "camera_name": day['camera_name'],
+            "days": 0, "recordings": 0, "duration": 0.0, "bytes": 0, "motion_events": 0
+        })
+        total['camera_name'] = day['camera_name']  # Последнее имя камеры
+        total['days'] += 1
+        for field in ('recordings', 'duration', 'bytes', 'motion_events'):
+            total[field] += day.get(field, 0)
+    
+    return {
+        "days": days,
+        "totals": sorted(totals.values(), key=lambda total: total['bytes'], reverse=True)
+    }
+
+async def serve_mse(websocket: WebSocket, camera_id: str, relay, queue: asyncio.Queue):
+    """Отправляет клиенту init-сегмент и fMP4-фрагменты, отвечает на ping"""
+    await websocket.send_text(json.dumps({"type": "init", "mime": relay.codec}))
+    await websocket.send_bytes(relay.init_segment)
+    
+    async def send_fragments():
+        while True:
+            fragment = await queue.get()
+            if fragment is None:
+                # ffmpeg остановился (камера недоступна) - клиент переподключится
+                break
+            await websocket.send_bytes(fragment)
+    
+    async def receive_pings():
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
+    
+    tasks = [asyncio.create_task(send_fragments()), asyncio.create_task(receive_pings())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        mse_manager.unsubscribe(camera_id, queue)
+    try:
+        await websocket.close()
+    except Exception:
+        pass
 
 @api_router.websocket("/ws/camera/{camera_id}")
-async def websocket_camera(websocket: WebSocket, camera_id: str):
-    await ws_manager.connect(camera_id, websocket)
+async def websocket_camera(websocket: WebSocket, camera_id: str, mode: str = "jpeg"):
+    if cluster_manager and not await camera_engine.is_active(camera_id):
+        owner = await cluster_manager.owner_url(camera_id)
+        if owner:
+            target = owner.replace('https://', 'wss://').replace('http://', 'ws://') + websocket.url.path
+            if websocket.url.query:
+                target += '?' + websocket.url.query
+            await proxy_websocket(websocket, target)
+            return
+    
+    if mode == "mse":
+        # H.264 passthrough; HEVC и ошибки ремукса - откат на JPEG в том же соединении
+        camera = await db.cameras.find_one({"id": camera_id}, {"_id": 0})
+        if camera and not is_hevc_codec(camera.get('codec')) and await camera_engine.is_active(camera_id):
+            relay, queue = await mse_manager.subscribe(camera_id, build_camera_url(camera))
+            if relay:
+                await websocket.accept()
+                await serve_mse(websocket, camera_id, relay, queue)
+                return
+        
+        await ws_manager.connect(camera_id, websocket)
+        await websocket.send_text(json.dumps({"type": "fallback", "mode": "jpeg"}))
+    else:
+        await ws_manager.connect(camera_id, websocket)
     try:
         while True:
             # Keep connection alive
@@ -682,6 +2171,166 @@ async def websocket_camera(websocket: WebSocket, camera_id: str):
     except WebSocketDisconnect:
         ws_manager.disconnect(camera_id, websocket)
 
+@api_router.websocket("/ws/events")
+async def websocket_events(
+    websocket: WebSocket,
+    topics: Optional[str] = None,
+    camera_id: Optional[List[str]] = Query(None),
+    since: Optional[int] = None,
+    stream: Optional[str] = None
+):
+    """Поток событий камер. topics - через запятую, группы (motion) или полные имена (motion.start).
+    После переподключения клиент передает stream и seq последнего события (since) и получает пропущенное
+    из буфера; resumed=false в hello означает, что часть событий потеряна и состояние нужно перечитать."""
+    await websocket.accept()
+    topic_filter = {topic.strip() for topic in topics.split(',') if topic.strip()} if topics else None
+    # seq другого запуска сервера несопоставимы - докачка только в пределах того же stream
+    resume_from = since if stream == event_bus.stream_id else None
+    queue, replay, complete = event_bus.subscribe(topic_filter, set(camera_id) if camera_id else None, resume_from)
+    
+    async def send_events():
+        await websocket.send_text(json.dumps({
+            "type": "hello",
+            "stream": event_bus.stream_id,
+            "seq": event_bus.seq,
+            "resumed": resume_from is not None and complete
+        }))
+        for text in replay:
+            await websocket.send_text(text)
+        while True:
+            text = await queue.get()
+            if text is None:
+                break
+            await websocket.send_text(text)
+    
+    async def receive_pings():
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
+    
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_pings())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_bus.unsubscribe(queue)
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+@api_router.get("/cluster")
+async def get_cluster_state():
+    """Узлы кластера и распределение камер"""
+    if not cluster_manager:
+        return {"enabled": False, "node_id": NODE_ID, "nodes": [], "leases": []}
+    
+    now = datetime.now(timezone.utc)
+    nodes = await db.cluster_nodes.find({"expires_at": {"$gt": now}}).to_list(None)
+    leases = await db.camera_leases.find({"expires_at": {"$gt": now}}).to_list(None)
+    return {
+        "enabled": True,
+        "node_id": NODE_ID,
+        "nodes": [
+            {"node_id": n['_id'], "url": n['url'], "cameras": n.get('cameras', 0),
+             "heartbeat_at": n['heartbeat_at'].isoformat()}
+            for n in nodes
+        ],
+        "leases": [
+            {"camera_id": lease['_id'], "node_id": lease['node_id'], "expires_at": lease['expires_at'].isoformat()}
+            for lease in leases
+        ]
+    }
+
+@api_router.post("/exports", response_model=ExportJob)
+async def create_export(request: ExportCreate):
+    """Экспорт записей камер за диапазон времени в один файл (фоновая задача)"""
+    if not request.camera_ids:
+        raise HTTPException(status_code=400, detail="No cameras selected")
+    if request.end_time <= request.start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    return await export_manager.create(request)
+
+@api_router.get("/exports", response_model=List[ExportJob])
+async def get_exports():
+    jobs = await db.exports.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    # Прогресс активных задач берем из памяти
+    return [export_manager.jobs.get(job['id'], job) for job in jobs]
+
+@api_router.get("/exports/{export_id}", response_model=ExportJob)
+async def get_export(export_id: str):
+    job = await export_manager.get(export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@api_router.get("/exports/{export_id}/download")
+async def download_export(export_id: str):
+    job = await export_manager.get(export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    
+    filepath = EXPORTS_DIR / job['filename']
+    if not filepath.exists():
+        raise HTTPException(status_code=404, detail="Export file not found")
+    
+    media_type = "application/zip" if filepath.suffix == '.zip' else "video/x-matroska"
+    return FileResponse(filepath, media_type=media_type, filename=job['filename'])
+
+@api_router.websocket("/ws/exports/{export_id}")
+async def websocket_export(websocket: WebSocket, export_id: str):
+    """Прогресс экспорта: JSON с состоянием задачи при каждом изменении"""
+    await websocket.accept()
+    queue = export_manager.subscribe(export_id)
+    try:
+        job = await export_manager.get(export_id)
+        if job:
+            await websocket.send_text(json.dumps(job))
+        while job and job['status'] in ('queued', 'running'):
+            job = await queue.get()
+            if job is None:
+                await websocket.send_text(json.dumps(await export_manager.get(export_id)))
+                break
+            await websocket.send_text(json.dumps(job))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        export_manager.unsubscribe(export_id, queue)
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+@api_router.post("/admin/cameras/{camera_id}/profile")
+async def profile_camera(
+    camera_id: str,
+    request: Request,
+    duration: float = Query(10.0, gt=0, le=60),
+    stack: bool = False
+):
+    """Профилирование конвейера камеры: время шагов итерации, ожидание/выполнение в пуле потоков,
+    опционально - сэмплированный стек event loop. Ответ приходит через duration секунд."""
+    redirect = await route_to_owner(camera_id, request)
+    if redirect:
+        return redirect
+    
+    try:
+        report = await camera_engine.profile(camera_id, duration, stack)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=400, detail="Camera is not active")
+    return report
+
+@api_router.get("/governor")
+async def get_governor_state():
+    """Текущий уровень сброса нагрузки и замеры конвейера камер"""
+    return await camera_engine.governor_state()
+
 # Include router
 app.include_router(api_router)
 
@@ -717,10 +2366,52 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+async def ensure_indexes():
+    # Индексы для диапазонных запросов по событиям движения
+    try:
+        await db.motion_events.create_index([("camera_id", 1), ("start_time", 1)])
+        await db.motion_events.create_index([("zones", 1), ("start_time", 1)])
+        await db.motion_events.create_index([("start_time", 1)])
+    except Exception as e:
+        logger.error(f"Failed to create motion_events indexes: {e}")
+    # Дневные сводки по диапазону дат (с фильтром по камерам и без)
+    try:
+        await db.camera_daily_stats.create_index([("date", 1)])
+        await db.camera_daily_stats.create_index([("camera_id", 1), ("date", 1)])
+    except Exception as e:
+        logger.error(f"Failed to create camera_daily_stats indexes: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    await ensure_indexes()
+    await export_manager.start()
+    
+    if ENGINE_MODE == 'api':
+        # Кадры движка транслируются WebSocket-клиентам этого процесса
+        app.state.frame_receiver = asyncio.create_task(
+            camera_engine.receive_frames(ws_manager.broadcast, event_bus.publish_event, ws_manager.viewer_counts)
+        )
+    else:
+        # В режиме api конвейером и кластером управляет процесс движка
+        governor.start()
+        if cluster_manager:
+            await cluster_manager.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Отпускаем lease, чтобы другие узлы сразу забрали камеры
+    if ENGINE_MODE == 'api':
+        app.state.frame_receiver.cancel()
+    else:
+        governor.stop()
+        if cluster_manager:
+            await cluster_manager.stop()
+    
     # Disconnect all cameras
     camera_ids = list(camera_manager.active_cameras.keys())
     for camera_id in camera_ids:
         await camera_manager.disconnect_camera(camera_id)
+    await mse_manager.close()
+    await export_manager.close()
+    preview_executor.shutdown(wait=False, cancel_futures=True)
     client.close()
\ No newline at end of file
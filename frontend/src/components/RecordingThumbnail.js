@@ -0,0 +1,60 @@
+import { useState } from 'react';
+import { getBackendUrl } from '../utils/api';
+
+const BACKEND_URL = getBackendUrl();
+const API = `${BACKEND_URL}/api`;
+
+// Постер записи; при наведении показывает кадры из спрайт-листа (скраббинг)
+export default function RecordingThumbnail({ recording }) {
+  const [tile, setTile] = useState(null);
+  const preview = recording.preview;
+
+  if (!preview) {
+    return (
+      <div
+        className="w-40 bg-black/40 rounded-md flex items-center justify-center text-white/40 text-xs"
+        style={{ aspectRatio: '16/9' }}
+        data-testid={`recording-thumbnail-${recording.id}`}
+      >
+        Нет превью
+      </div>
+    );
+  }
+
+  const handleMouseMove = (e) => {
+    const rect = e.currentTarget.getBoundingClientRect();
+    const ratio = Math.min(Math.max((e.clientX - rect.left) / rect.width, 0), 0.999);
+    setTile(Math.floor(ratio * preview.count));
+  };
+
+  const col = tile !== null ? tile % preview.columns : 0;
+  const row = tile !== null ? Math.floor(tile / preview.columns) : 0;
+
+  return (
+    <div
+      className="w-40 rounded-md overflow-hidden bg-black"
+      style={{ aspectRatio: `${preview.tile_width}/${preview.tile_height}` }}
+      onMouseMove={handleMouseMove}
+      onMouseLeave={() => setTile(null)}
+      data-testid={`recording-thumbnail-${recording.id}`}
+    >
+      {tile === null ? (
+        <img
+          src={`${API}/recordings/${recording.id}/poster`}
+          alt={recording.camera_name}
+          loading="lazy"
+          className="w-full h-full object-cover"
+        />
+      ) : (
+        <div
+          className="w-full h-full"
+          style={{
+            backgroundImage: `url(${API}/recordings/${recording.id}/sprite)`,
+            backgroundSize: `${preview.columns * 100}% ${preview.rows * 100}%`,
+            backgroundPosition: `${preview.columns > 1 ? (col / (preview.columns - 1)) * 100 : 0}% ${preview.rows > 1 ? (row / (preview.rows - 1)) * 100 : 0}%`
+          }}
+        />
+      )}
+    </div>
+  );
+}
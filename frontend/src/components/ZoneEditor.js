@@ -2,7 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import axios from 'axios';
 import { Button } from './ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
-import { Trash2, RefreshCw } from 'lucide-react';
+import { Trash2, RefreshCw, Flame } from 'lucide-react';
 import { toast } from 'sonner';
 import { getBackendUrl } from '../utils/api';
 
@@ -17,6 +17,8 @@ export default function ZoneEditor({ cameraId, initialZones, onSave }) {
   const [snapshot, setSnapshot] = useState(null);
   const [loading, setLoading] = useState(false);
   const imageRef = useRef(null);
+  const [heatmap, setHeatmap] = useState(null);
+  const [showHeatmap, setShowHeatmap] = useState(false);
 
   useEffect(() => {
     loadSnapshot();
@@ -26,7 +28,7 @@ export default function ZoneEditor({ cameraId, initialZones, onSave }) {
     if (snapshot) {
       drawZones();
     }
-  }, [zones, currentZone, snapshot]);
+  }, [zones, currentZone, snapshot, heatmap, showHeatmap]);
 
   const loadSnapshot = async () => {
     setLoading(true);
@@ -58,6 +60,24 @@ export default function ZoneEditor({ cameraId, initialZones, onSave }) {
     }
   };
 
+  const loadHeatmap = () => {
+    // Heatmap is at motion analysis resolution, scaled to the frame when drawn
+    const img = new Image();
+    img.onload = () => setHeatmap(img);
+    img.onerror = () => {
+      setShowHeatmap(false);
+      toast.error('Тепловая карта движения пока недоступна');
+    };
+    img.src = `${API}/cameras/${cameraId}/heatmap.png?t=${Date.now()}`;
+  };
+
+  const toggleHeatmap = () => {
+    if (!showHeatmap) {
+      loadHeatmap();
+    }
+    setShowHeatmap(!showHeatmap);
+  };
+
   const drawZones = () => {
     const canvas = canvasRef.current;
     if (!canvas || !imageRef.current) return;
@@ -69,6 +89,13 @@ export default function ZoneEditor({ cameraId, initialZones, onSave }) {
       ctx.drawImage(imageRef.current, 0, 0);
     }
 
+    // Where motion actually happens (MOG2 foreground over time)
+    if (showHeatmap && heatmap) {
+      ctx.globalAlpha = 0.6;
+      ctx.drawImage(heatmap, 0, 0, canvas.width, canvas.height);
+      ctx.globalAlpha = 1;
+    }
+
     // Draw existing zones
     zones.forEach((zone, index) => {
       if (zone.points && zone.points.length > 0) {
@@ -216,6 +243,17 @@ export default function ZoneEditor({ cameraId, initialZones, onSave }) {
               <RefreshCw className="mr-2 h-4 w-4" />
               Обновить изображение
             </Button>
+
+            <Button
+              onClick={toggleHeatmap}
+              variant="outline"
+              className={`border-white/30 text-white hover:bg-white/10 ${showHeatmap ? 'bg-white/20' : ''}`}
+              data-testid="toggle-heatmap-btn"
+              disabled={!snapshot}
+            >
+              <Flame className="mr-2 h-4 w-4" />
+              Тепловая карта движения
+            </Button>
             
             {!isDrawing ? (
               <Button
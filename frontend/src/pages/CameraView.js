@@ -13,6 +13,8 @@ import { getBackendUrl, getWebSocketUrl } from '../utils/api';
 const BACKEND_URL = getBackendUrl();
 const API = `${BACKEND_URL}/api`;
 const WS_URL = getWebSocketUrl();
+// H.264 без перекодирования через Media Source Extensions, иначе JPEG-кадры
+const SUPPORTS_MSE = typeof window !== 'undefined' && 'MediaSource' in window;
 
 export default function CameraView() {
   const { id } = useParams();
@@ -20,7 +22,11 @@ export default function CameraView() {
   const [camera, setCamera] = useState(null);
   const [loading, setLoading] = useState(true);
   const canvasRef = useRef(null);
+  const videoRef = useRef(null);
   const wsRef = useRef(null);
+  const mseRef = useRef(null);
+  const forceJpegRef = useRef(!SUPPORTS_MSE);
+  const [liveMode, setLiveMode] = useState('jpeg');
   const [isRecording, setIsRecording] = useState(false);
   const [activeTab, setActiveTab] = useState('live');
 
@@ -48,8 +54,66 @@ export default function CameraView() {
     }
   };
 
+  const flushSegments = (state) => {
+    const { sourceBuffer, queue } = state;
+    if (!sourceBuffer || sourceBuffer.updating || queue.length === 0) return;
+    sourceBuffer.appendBuffer(queue.shift());
+  };
+
+  const setupMediaSource = (mime) => {
+    const mediaSource = new MediaSource();
+    const state = { mediaSource, sourceBuffer: null, queue: [] };
+    mseRef.current = state;
+    videoRef.current.src = URL.createObjectURL(mediaSource);
+
+    mediaSource.addEventListener('sourceopen', () => {
+      state.sourceBuffer = mediaSource.addSourceBuffer(mime);
+      state.sourceBuffer.addEventListener('updateend', () => {
+        const video = videoRef.current;
+        const buffered = state.sourceBuffer.buffered;
+        if (video && buffered.length > 0) {
+          const end = buffered.end(buffered.length - 1);
+          // Держимся у live-края и не копим буфер
+          if (end - video.currentTime > 1.5) {
+            video.currentTime = end - 0.3;
+          }
+          if (video.currentTime - buffered.start(0) > 30 && !state.sourceBuffer.updating) {
+            state.sourceBuffer.remove(buffered.start(0), video.currentTime - 10);
+            return;
+          }
+        }
+        flushSegments(state);
+      });
+      flushSegments(state);
+    });
+  };
+
+  const drawJpeg = (data) => {
+    // Create image from binary data
+    const blob = new Blob([data], { type: 'image/jpeg' });
+    const url = URL.createObjectURL(blob);
+    const img = new Image();
+    
+    img.onload = () => {
+      const canvas = canvasRef.current;
+      if (canvas) {
+        const ctx = canvas.getContext('2d');
+        canvas.width = img.width;
+        canvas.height = img.height;
+        ctx.drawImage(img, 0, 0);
+      }
+      URL.revokeObjectURL(url);
+    };
+    
+    img.src = url;
+  };
+
   const connectWebSocket = () => {
-    const ws = new WebSocket(`${WS_URL}/api/ws/camera/${id}`);
+    const mode = forceJpegRef.current ? 'jpeg' : 'mse';
+    const ws = new WebSocket(`${WS_URL}/api/ws/camera/${id}?mode=${mode}`);
+    ws.binaryType = 'arraybuffer';
+    mseRef.current = null;
+    setLiveMode('jpeg');
     
     ws.onopen = () => {
       console.log('WebSocket connected');
@@ -62,25 +126,31 @@ export default function CameraView() {
     };
 
     ws.onmessage = (event) => {
-      if (event.data === 'pong') return;
-      
-      // Create image from binary data
-      const blob = event.data;
-      const url = URL.createObjectURL(blob);
-      const img = new Image();
-      
-      img.onload = () => {
-        const canvas = canvasRef.current;
-        if (canvas) {
-          const ctx = canvas.getContext('2d');
-          canvas.width = img.width;
-          canvas.height = img.height;
-          ctx.drawImage(img, 0, 0);
+      if (typeof event.data === 'string') {
+        if (event.data === 'pong') return;
+        
+        const message = JSON.parse(event.data);
+        if (message.type === 'init') {
+          if (!MediaSource.isTypeSupported(message.mime)) {
+            // Браузер не поддерживает кодек камеры - переподключаемся в режиме JPEG
+            forceJpegRef.current = true;
+            ws.close();
+            return;
+          }
+          setLiveMode('mse');
+          setupMediaSource(message.mime);
+        } else if (message.type === 'fallback') {
+          setLiveMode('jpeg');
         }
-        URL.revokeObjectURL(url);
-      };
+        return;
+      }
       
-      img.src = url;
+      if (mseRef.current) {
+        mseRef.current.queue.push(event.data);
+        flushSegments(mseRef.current);
+      } else {
+        drawJpeg(event.data);
+      }
     };
 
     ws.onerror = (error) => {
@@ -183,9 +253,17 @@ export default function CameraView() {
                 <div className="relative bg-black rounded-lg overflow-hidden" style={{ aspectRatio: '16/9' }}>
                   <canvas
                     ref={canvasRef}
-                    className="w-full h-full object-contain"
+                    className={`w-full h-full object-contain ${liveMode === 'mse' ? 'hidden' : ''}`}
                     data-testid="video-canvas"
                   />
+                  <video
+                    ref={videoRef}
+                    autoPlay
+                    muted
+                    playsInline
+                    className={`w-full h-full object-contain ${liveMode === 'mse' ? '' : 'hidden'}`}
+                    data-testid="video-live"
+                  />
                   {isRecording && (
                     <div className="absolute top-4 right-4 bg-red-500 text-white px-3 py-1 rounded-full flex items-center gap-2" data-testid="recording-indicator">
                       <div className="w-3 h-3 bg-white rounded-full animate-pulse" />
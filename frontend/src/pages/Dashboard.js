@@ -7,9 +7,13 @@ import { Badge } from '../components/ui/badge';
 import { Plus, Video, Trash2, Play, Square, Eye } from 'lucide-react';
 import { toast } from 'sonner';
 import { getBackendUrl } from '../utils/api';
+import { subscribeCameraEvents } from '../utils/events';
 
 const BACKEND_URL = getBackendUrl();
 const API = `${BACKEND_URL}/api`;
+const POLL_INTERVAL = 30000;
+// В cluster mode узел шлет события только своих камер, остальные видны лишь при опросе
+const CLUSTER_POLL_INTERVAL = 5000;
 
 export default function Dashboard() {
   const [cameras, setCameras] = useState([]);
@@ -18,6 +22,28 @@ export default function Dashboard() {
 
   useEffect(() => {
     fetchCameras();
+    // Статусы обновляются по событиям камер; редкий опрос обновляет fps/зрителей
+    // (список отдается с ETag: без изменений сервер отвечает 304)
+    const unsubscribe = subscribeCameraEvents({
+      topics: ['camera', 'recording'],
+      onEvent: fetchCameras,
+      onResync: fetchCameras
+    });
+    let interval = setInterval(fetchCameras, POLL_INTERVAL);
+    let cancelled = false;
+    axios.get(`${API}/cluster`)
+      .then((response) => {
+        if (!cancelled && response.data.enabled) {
+          clearInterval(interval);
+          interval = setInterval(fetchCameras, CLUSTER_POLL_INTERVAL);
+        }
+      })
+      .catch((error) => console.error('Error fetching cluster state:', error));
+    return () => {
+      cancelled = true;
+      unsubscribe();
+      clearInterval(interval);
+    };
   }, []);
 
   const fetchCameras = async () => {
@@ -187,7 +213,12 @@ export default function Dashboard() {
                   {camera.resolution && (
                     <div className="space-y-1 mb-4 text-sm text-white/70">
                       <p data-testid={`camera-resolution-${camera.id}`}>Resolution: {camera.resolution}</p>
-                      <p data-testid={`camera-fps-${camera.id}`}>FPS: {camera.fps?.toFixed(1)}</p>
+                      <p data-testid={`camera-fps-${camera.id}`}>
+                        FPS: {camera.measured_fps != null ? `${camera.measured_fps.toFixed(1)} / ${camera.fps?.toFixed(1)}` : camera.fps?.toFixed(1)}
+                      </p>
+                      {camera.viewers > 0 && (
+                        <p data-testid={`camera-viewers-${camera.id}`}>Viewers: {camera.viewers}</p>
+                      )}
                       <p data-testid={`camera-codec-${camera.id}`}>Codec: {camera.codec}</p>
                     </div>
                   )}
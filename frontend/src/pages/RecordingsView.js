@@ -6,6 +6,7 @@ import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card'
 import { ArrowLeft, Download, Play } from 'lucide-react';
 import { toast } from 'sonner';
 import VideoPlayer from '../components/VideoPlayer';
+import RecordingThumbnail from '../components/RecordingThumbnail';
 import { getBackendUrl } from '../utils/api';
 
 const BACKEND_URL = getBackendUrl();
@@ -132,6 +133,9 @@ export default function RecordingsView() {
               >
                 <CardContent className="p-6">
                   <div className="flex items-center justify-between">
+                    <div className="mr-6">
+                      <RecordingThumbnail recording={recording} />
+                    </div>
                     <div className="flex-1">
                       <h3 className="text-white text-xl font-semibold mb-2" data-testid={`recording-camera-${recording.id}`}>
                         {recording.camera_name}
@@ -0,0 +1,58 @@
+import { getWebSocketUrl } from './api';
+
+// Подписка на события камер (/api/ws/events) с переподключением.
+// После разрыва сервер досылает пропущенные события из буфера (stream + since);
+// если они уже вытеснены или сервер перезапущен - вызывается onResync, чтобы перечитать состояние.
+export const subscribeCameraEvents = ({ topics, cameraIds, onEvent, onResync }) => {
+  const wsUrl = getWebSocketUrl();
+  let ws = null;
+  let stream = null;
+  let lastSeq = null;
+  let closed = false;
+  let retryTimer = null;
+  let pingTimer = null;
+
+  const connect = () => {
+    const params = new URLSearchParams();
+    if (topics) params.set('topics', topics.join(','));
+    (cameraIds || []).forEach((id) => params.append('camera_id', id));
+    if (stream !== null && lastSeq !== null) {
+      params.set('stream', stream);
+      params.set('since', lastSeq);
+    }
+
+    ws = new WebSocket(`${wsUrl}/api/ws/events?${params}`);
+    ws.onopen = () => {
+      pingTimer = setInterval(() => {
+        if (ws.readyState === WebSocket.OPEN) ws.send('ping');
+      }, 30000);
+    };
+    ws.onmessage = (message) => {
+      if (message.data === 'pong') return;
+      const data = JSON.parse(message.data);
+      if (data.type === 'hello') {
+        if (!data.resumed) {
+          if (stream !== null && onResync) onResync();
+          lastSeq = data.seq;
+        }
+        stream = data.stream;
+        return;
+      }
+      lastSeq = data.seq;
+      onEvent(data);
+    };
+    ws.onclose = () => {
+      clearInterval(pingTimer);
+      if (!closed) retryTimer = setTimeout(connect, 2000);
+    };
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    clearInterval(pingTimer);
+    if (ws) ws.close();
+  };
+};
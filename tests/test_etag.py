@@ -0,0 +1,28 @@
+import pytest
+
+from server import etag_matches
+
+ETAG = '"3f2a9c1b7e5d4a60"'
+
+
+@pytest.mark.parametrize('if_none_match', [
+    ETAG,
+    f'W/{ETAG}',
+    f'"0000000000000000", {ETAG}',
+    f'"0000000000000000",W/{ETAG}',
+    f'  {ETAG}  ',
+    '*',
+])
+def test_matching_if_none_match(if_none_match):
+    assert etag_matches(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize('if_none_match', [
+    None,
+    '',
+    '"0000000000000000"',
+    '"0000000000000000", W/"1111111111111111"',
+    ETAG.strip('"'),  # Без кавычек это другой тег
+])
+def test_non_matching_if_none_match(if_none_match):
+    assert not etag_matches(if_none_match, ETAG)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import server
+from server import EventBus
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    monkeypatch.setattr(server, 'EVENT_BUFFER_SIZE', 5)
+    return EventBus()
+
+
+def publish(bus: EventBus, count: int, topic: str = 'motion.start', camera_id: str = 'cam-1'):
+    for _ in range(count):
+        bus.publish(topic, camera_id)
+
+
+def seqs(texts):
+    return [json.loads(text)['seq'] for text in texts]
+
+
+def test_subscribe_without_since_has_no_replay(bus):
+    publish(bus, 3)
+    queue, replay, complete = bus.subscribe(None, None, None)
+    assert replay == [] and complete
+    publish(bus, 1)
+    assert json.loads(queue.get_nowait())['seq'] == 4
+
+
+def test_replay_since_inside_buffer(bus):
+    publish(bus, 4)
+    _, replay, complete = bus.subscribe(None, None, 2)
+    assert seqs(replay) == [3, 4]
+    assert complete
+
+
+def test_replay_since_oldest_buffered_event(bus):
+    publish(bus, 8)  # В буфере seq 4..8
+    _, replay, complete = bus.subscribe(None, None, 3)
+    assert seqs(replay) == [4, 5, 6, 7, 8]
+    assert complete
+
+
+def test_replay_since_evicted_from_buffer(bus):
+    publish(bus, 8)
+    _, replay, complete = bus.subscribe(None, None, 2)
+    assert seqs(replay) == [4, 5, 6, 7, 8]
+    assert not complete  # seq 3 вытеснен - клиент должен перечитать состояние
+
+
+def test_since_current_seq_is_complete(bus):
+    publish(bus, 8)
+    _, replay, complete = bus.subscribe(None, None, 8)
+    assert replay == [] and complete
+
+
+def test_since_ahead_of_stream_is_not_resumed(bus):
+    # seq другого запуска процесса (или движка) больше текущего
+    publish(bus, 2)
+    _, replay, complete = bus.subscribe(None, None, 10)
+    assert replay == [] and not complete
+
+
+def test_replay_applies_topic_and_camera_filters(bus):
+    bus.publish('motion.start', 'cam-1')
+    bus.publish('recording.start', 'cam-1')
+    bus.publish('motion.end', 'cam-2')
+    bus.publish('motion.end', 'cam-1')
+    _, replay, complete = bus.subscribe({'motion'}, {'cam-1'}, 0)
+    assert seqs(replay) == [1, 4]
+    assert complete
+    _, replay, _ = bus.subscribe({'recording.start'}, None, 0)
+    assert seqs(replay) == [2]
+
+
+def test_overflowing_subscriber_is_dropped(bus, monkeypatch):
+    monkeypatch.setattr(server, 'EVENT_CLIENT_QUEUE', 2)
+    queue, _, _ = bus.subscribe(None, None, None)
+    publish(bus, 3)
+    assert queue not in bus.subscribers
+    assert json.loads(queue.get_nowait())['seq'] == 2
+    assert queue.get_nowait() is None
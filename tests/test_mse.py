@@ -0,0 +1,136 @@
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from mse import CLIENT_QUEUE_SIZE, FragmentedMP4Relay, codec_string, find_box, is_keyframe_fragment, iter_boxes
+
+
+def box(box_type: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+@pytest.fixture(scope='module')
+def fragmented_mp4(tmp_path_factory):
+    """3 с H.264 baseline, ключевой кадр каждую секунду, фрагменты как у FragmentedMP4Relay"""
+    if not shutil.which('ffmpeg'):
+        pytest.skip('ffmpeg is not installed')
+    path = tmp_path_factory.mktemp('mse') / 'fragmented.mp4'
+    result = subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=10', '-t', '3',
+        '-c:v', 'libx264', '-profile:v', 'baseline', '-level', '3.0',
+        '-g', '10', '-x264-params', 'scenecut=0', '-pix_fmt', 'yuv420p',
+        '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        '-frag_duration', '250000', str(path)
+    ], capture_output=True)
+    if result.returncode != 0:
+        pytest.skip(f'ffmpeg cannot encode H.264: {result.stderr.decode(errors="ignore")}')
+    return path.read_bytes()
+
+
+def test_iter_boxes_top_level(fragmented_mp4):
+    types = [box_type for box_type, _, _ in iter_boxes(fragmented_mp4)]
+    assert types[:2] == [b'ftyp', b'moov']
+    assert types.count(b'moof') == types.count(b'mdat') > 3
+
+
+def test_iter_boxes_large_and_open_ended_sizes():
+    large = struct.pack('>I4sQ', 1, b'mdat', 16 + 4) + b'abcd'
+    open_ended = struct.pack('>I4s', 0, b'free') + b'tail'
+    data = box(b'ftyp', b'isom') + large + open_ended
+    assert list(iter_boxes(data)) == [
+        (b'ftyp', 8, 12),
+        (b'mdat', 28, 32),
+        (b'free', 40, 44),
+    ]
+
+
+def test_iter_boxes_stops_on_truncated_header():
+    data = box(b'ftyp', b'isom') + struct.pack('>I4s', 4, b'moov')
+    assert [box_type for box_type, _, _ in iter_boxes(data)] == [b'ftyp']
+
+
+def test_find_box_nested():
+    data = box(b'moof', box(b'mfhd', b'\0' * 8) + box(b'traf', box(b'tfhd', b'\0' * 8)))
+    start, end = find_box(data, [b'moof', b'traf', b'tfhd'])
+    assert data[start - 4:start] == b'tfhd' and end == len(data)
+    assert find_box(data, [b'moof', b'trun']) is None
+
+
+def test_codec_string_from_init_segment(fragmented_mp4):
+    boxes = list(iter_boxes(fragmented_mp4))
+    init_segment = fragmented_mp4[:boxes[1][2]]
+    assert codec_string(init_segment) == 'video/mp4; codecs="avc1.42C01E"'
+
+
+def test_codec_string_without_avcc():
+    assert codec_string(box(b'ftyp', b'isom') + box(b'moov', box(b'hvcC', b'\0' * 8))) is None
+
+
+def test_keyframe_fragments_follow_gop(fragmented_mp4):
+    keyframes = [
+        is_keyframe_fragment(fragmented_mp4[start - 8:end])
+        for box_type, start, end in iter_boxes(fragmented_mp4) if box_type == b'moof'
+    ]
+    # Фрагменты по 250 мс при GOP 1 с: ключевой кадр открывает каждый четвертый
+    assert keyframes == [index % 4 == 0 for index in range(len(keyframes))]
+    assert keyframes.count(True) == 3
+
+
+def test_keyframe_from_tfhd_default_flags():
+    track_id = struct.pack('>I', 1)
+    sync = box(b'moof', box(b'traf', box(b'tfhd', struct.pack('>I', 0x20) + track_id + struct.pack('>I', 0))))
+    non_sync = box(b'moof', box(b'traf', box(b'tfhd', struct.pack('>I', 0x20) + track_id + struct.pack('>I', 0x00010000))))
+    assert is_keyframe_fragment(sync)
+    assert not is_keyframe_fragment(non_sync)
+    assert not is_keyframe_fragment(box(b'moof', box(b'mfhd', b'\0' * 8)))
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def publish_gop(relay, index, length):
+    for position in range(length):
+        relay.publish(f'{index}:{position}'.encode(), position == 0)
+
+
+def test_subscribe_replays_short_gop_from_keyframe():
+    relay = FragmentedMP4Relay('cam', 'rtsp://camera')
+    publish_gop(relay, 0, 3)
+    publish_gop(relay, 1, 4)
+    assert drain(relay.subscribe()) == [b'1:0', b'1:1', b'1:2', b'1:3']
+
+
+def test_long_gop_subscriber_waits_for_next_keyframe():
+    relay = FragmentedMP4Relay('cam', 'rtsp://camera')
+    publish_gop(relay, 0, CLIENT_QUEUE_SIZE + 10)
+    queue = relay.subscribe()
+    assert drain(queue) == []
+    relay.publish(b'0:late', False)
+    assert drain(queue) == []
+    publish_gop(relay, 1, 2)
+    assert drain(queue) == [b'1:0', b'1:1']
+
+
+def test_slow_subscriber_restarts_from_keyframe():
+    relay = FragmentedMP4Relay('cam', 'rtsp://camera')
+    queue = relay.subscribe()
+    publish_gop(relay, 0, 20)
+    publish_gop(relay, 1, 20)  # Очередь переполняется внутри GOP 1
+    assert drain(queue) == [f'1:{position}'.encode() for position in range(20)]
+
+
+def test_slow_subscriber_on_long_gop_waits_for_keyframe():
+    relay = FragmentedMP4Relay('cam', 'rtsp://camera')
+    queue = relay.subscribe()
+    publish_gop(relay, 0, CLIENT_QUEUE_SIZE + 5)
+    assert drain(queue) == []
+    publish_gop(relay, 1, 1)
+    assert drain(queue) == [b'1:0']
+    assert len(relay.gop) == 1
@@ -0,0 +1,546 @@
+"""Нагрузочный тест live-просмотра: сотни WebSocket-зрителей одной камеры.
+
+Скрипт поднимает синтетическую MJPEG-камеру (HTTP multipart), запускает backend
+в отдельном процессе (MongoDB из --mongo-url или in-memory через mongomock-motor),
+добавляет камеру через REST и открывает N клиентов /api/ws/camera/{id}, часть из
+которых намеренно читает медленно. В каждый кадр камеры зашит штрихкод с временем
+генерации, поэтому клиент считает задержку "камера -> зритель" без доступа к серверу.
+
+Отчет: fps и перцентили задержки по клиентам и группам, CPU и RSS процесса сервера.
+JSON-результат можно сохранить как baseline и сравнивать с ним следующие прогоны:
+
+    python viewer_load_test.py --clients 300 --slow 30 --output baseline.json
+    python viewer_load_test.py --clients 300 --slow 30 --baseline baseline.json
+
+Против уже запущенного сервера (CPU/RSS - только если указан его PID на этой машине):
+
+    python viewer_load_test.py --server-url http://127.0.0.1:8001 --server-pid 1234
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import cv2
+import numpy as np
+import requests
+import websockets
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / 'backend'
+
+# Штрихкод времени: TIMESTAMP_BITS ячеек на всю ширину верхней полосы кадра
+TIMESTAMP_BITS = 48
+BARCODE_HEIGHT_RATIO = 1 / 12
+MAX_VALID_LATENCY_MS = 60_000
+
+# Метрики для сравнения с baseline: (путь в отчете, больше - хуже)
+BASELINE_METRICS = [
+    (('groups', 'normal', 'fps', 'median'), False),
+    (('groups', 'normal', 'fps', 'min'), False),
+    (('groups', 'normal', 'latency_ms', 'p50'), True),
+    (('groups', 'normal', 'latency_ms', 'p95'), True),
+    (('groups', 'normal', 'latency_ms', 'p99'), True),
+    (('groups', 'slow', 'latency_ms', 'p95'), True),
+    (('server', 'cpu_percent', 'mean'), True),
+    (('server', 'rss_mb', 'max'), True),
+]
+
+
+# --- Синтетическая камера ---
+
+def draw_timestamp(frame: np.ndarray, timestamp_ms: int):
+    """Записывает время в верхнюю полосу кадра черно-белыми ячейками (старший бит слева)"""
+    height, width = frame.shape[:2]
+    band = int(height * BARCODE_HEIGHT_RATIO)
+    for bit in range(TIMESTAMP_BITS):
+        x0 = bit * width // TIMESTAMP_BITS
+        x1 = (bit + 1) * width // TIMESTAMP_BITS
+        value = 255 if timestamp_ms >> (TIMESTAMP_BITS - 1 - bit) & 1 else 0
+        frame[:band, x0:x1] = value
+
+
+def read_timestamp(gray: np.ndarray) -> int:
+    """Обратная операция для кадра любого масштаба (серый, после JPEG)"""
+    height, width = gray.shape[:2]
+    y = int(height * BARCODE_HEIGHT_RATIO / 2)
+    value = 0
+    for bit in range(TIMESTAMP_BITS):
+        x = int((bit + 0.5) * width / TIMESTAMP_BITS)
+        value = (value << 1) | (1 if gray[y, x] > 127 else 0)
+    return value
+
+
+class SyntheticCameraHandler(BaseHTTPRequestHandler):
+    """MJPEG-поток (multipart/x-mixed-replace), как у IP-камеры; кадры генерируются в реальном времени"""
+    size = (1280, 720)
+    fps = 15.0
+    motion = False
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+        self.end_headers()
+        width, height = self.size
+        frame = np.full((height, width, 3), 96, dtype=np.uint8)
+        interval = 1.0 / self.fps
+        next_time = time.monotonic()
+        index = 0
+        while True:
+            frame[:] = 96
+            if self.motion:
+                # Движущийся прямоугольник для нагрузки на детектор движения
+                x = (index * 8) % (width - 200)
+                cv2.rectangle(frame, (x, height // 2), (x + 200, height // 2 + 150), (0, 200, 255), -1)
+            draw_timestamp(frame, int(time.time() * 1000))
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            data = buffer.tobytes()
+            try:
+                self.wfile.write(
+                    b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(data)
+                    + data + b'\r\n'
+                )
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            index += 1
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_synthetic_camera(size, fps: float, motion: bool) -> ThreadingHTTPServer:
+    SyntheticCameraHandler.size = size
+    SyntheticCameraHandler.fps = fps
+    SyntheticCameraHandler.motion = motion
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SyntheticCameraHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+# --- Сервер ---
+
+def serve(port: int, mongo_url: str):
+    """Режим --serve: backend в этом процессе (для замеров CPU/RSS отдельно от клиентов)"""
+    # Отдельная база, чтобы тест не трогал камеры и записи рабочей инсталляции
+    os.environ['MONGO_URL'] = mongo_url or 'mongodb://localhost:27017'
+    os.environ['DB_NAME'] = 'viewer_load_test'
+    sys.path.insert(0, str(BACKEND_DIR))
+    import uvicorn
+    import server
+
+    if not mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("In-memory MongoDB requires mongomock-motor (pip install mongomock-motor) or pass --mongo-url")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[os.environ['DB_NAME']]
+
+    uvicorn.run(server.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(api_url: str, process=None, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(f"{api_url}/cameras", timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise SystemExit(f"Server at {api_url} did not start in {timeout}s")
+
+
+def setup_camera(api_url: str, camera_url: str, motion: bool, timeout: float = 30.0) -> str:
+    response = requests.post(f"{api_url}/cameras", json={"name": "Load test camera", "url": camera_url}, timeout=10)
+    response.raise_for_status()
+    camera_id = response.json()['id']
+    requests.put(
+        f"{api_url}/cameras/{camera_id}",
+        json={"motion_settings": {"enabled": motion}},
+        timeout=10
+    ).raise_for_status()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if requests.post(f"{api_url}/cameras/{camera_id}/start", timeout=30).ok:
+            return camera_id
+        time.sleep(1)
+    raise SystemExit(f"Camera {camera_id} did not start in {timeout}s")
+
+
+class ProcessSampler(threading.Thread):
+    """CPU (% одного ядра) и RSS процесса сервера по /proc/<pid>, раз в interval секунд"""
+    def __init__(self, pid: int, interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent = []
+        self.rss_mb = []
+        self.collecting = False
+        self.stop_event = threading.Event()
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks  # utime + stime
+
+    def rss(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    def run(self):
+        try:
+            last_cpu, last_time = self.cpu_seconds(), time.monotonic()
+            while not self.stop_event.wait(self.interval):
+                cpu, now = self.cpu_seconds(), time.monotonic()
+                if self.collecting:
+                    self.cpu_percent.append(100.0 * (cpu - last_cpu) / (now - last_time))
+                    self.rss_mb.append(self.rss())
+                last_cpu, last_time = cpu, now
+        except (FileNotFoundError, ProcessLookupError):
+            pass
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+# --- Клиенты ---
+
+async def run_client(index: int, ws_url: str, slow_delay: float, latency_every: int,
+                     connect_at: float, measure_start: float, measure_end: float) -> dict:
+    result = {
+        "client": index,
+        "group": "slow" if slow_delay else "normal",
+        "frames": 0,
+        "bytes": 0,
+        "latency_ms": [],
+        "bad_timestamps": 0,
+        "error": None,
+    }
+    await asyncio.sleep(max(0.0, connect_at - time.time()))
+    try:
+        # Медленному клиенту - минимальный буфер, чтобы давление доходило до сервера
+        async with websockets.connect(ws_url, max_size=None, max_queue=1 if slow_delay else 16) as ws:
+            while True:
+                remaining = measure_end - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                received = time.time()
+                if not isinstance(message, bytes) or received < measure_start:
+                    continue
+                result["frames"] += 1
+                result["bytes"] += len(message)
+                if result["frames"] % latency_every == 0:
+                    gray = cv2.imdecode(np.frombuffer(message, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+                    if gray is None:
+                        result["bad_timestamps"] += 1
+                    else:
+                        latency = received * 1000 - read_timestamp(gray)
+                        if -1000 < latency < MAX_VALID_LATENCY_MS:
+                            result["latency_ms"].append(latency)
+                        else:
+                            result["bad_timestamps"] += 1
+                if slow_delay:
+                    await asyncio.sleep(slow_delay)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_client_batch(clients: list, ws_url: str, latency_every: int, measure_start: float, measure_end: float) -> list:
+    """Точка входа процесса-генератора нагрузки: clients - [(index, slow_delay, connect_at)]"""
+    async def main():
+        return await asyncio.gather(*[
+            run_client(index, ws_url, slow_delay, latency_every, connect_at, measure_start, measure_end)
+            for index, slow_delay, connect_at in clients
+        ])
+
+    start_cpu = time.process_time()
+    results = asyncio.run(main())
+    cpu = time.process_time() - start_cpu
+    for result in results:
+        result["worker_cpu_seconds"] = cpu
+    return results
+
+
+# --- Отчет ---
+
+def percentile(ordered: list, q: float):
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 1)
+
+
+def summarize_latency(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "samples": len(ordered),
+        "p50": percentile(ordered, 0.5),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": round(ordered[-1], 1) if ordered else None,
+    }
+
+
+def summarize_values(values: list) -> dict:
+    if not values:
+        return {"min": None, "median": None, "mean": None, "max": None}
+    return {
+        "min": round(min(values), 2),
+        "median": round(statistics.median(values), 2),
+        "mean": round(statistics.mean(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def build_report(args, results: list, sampler, governor_state, workers_cpu: float) -> dict:
+    clients = []
+    groups = {}
+    for result in sorted(results, key=lambda r: r["client"]):
+        fps = result["frames"] / args.duration
+        clients.append({
+            "client": result["client"],
+            "group": result["group"],
+            "fps": round(fps, 2),
+            "kbps": round(result["bytes"] * 8 / 1000 / args.duration, 1),
+            "latency_ms": summarize_latency(result["latency_ms"]),
+            "bad_timestamps": result["bad_timestamps"],
+            "error": result["error"],
+        })
+        group = groups.setdefault(result["group"], {"fps": [], "latency": [], "errors": 0, "clients": 0})
+        group["clients"] += 1
+        group["fps"].append(fps)
+        group["latency"].extend(result["latency_ms"])
+        group["errors"] += bool(result["error"])
+
+    return {
+        "config": {
+            "clients": args.clients,
+            "slow": args.slow,
+            "slow_delay": args.slow_delay,
+            "duration": args.duration,
+            "camera_fps": args.camera_fps,
+            "camera_size": args.camera_size,
+            "motion": args.motion,
+            "workers": args.workers,
+        },
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "groups": {
+            name: {
+                "clients": group["clients"],
+                "errors": group["errors"],
+                "fps": summarize_values(group["fps"]),
+                "latency_ms": summarize_latency(group["latency"]),
+            }
+            for name, group in groups.items()
+        },
+        "server": {
+            "cpu_percent": summarize_values(sampler.cpu_percent) if sampler else None,
+            "rss_mb": summarize_values(sampler.rss_mb) if sampler else None,
+            "governor": governor_state,
+        },
+        # Если генератор нагрузки сам упирается в CPU, цифры клиентов занижены
+        "load_generator_cpu_percent": round(100.0 * workers_cpu / args.duration, 1),
+        "clients": clients,
+    }
+
+
+def lookup(report: dict, path: tuple):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> list:
+    """Возвращает список регрессий; метрики без значения в одном из отчетов пропускаются"""
+    regressions = []
+    if baseline.get('config') != report['config']:
+        print("\nWarning: baseline was recorded with a different configuration")
+    print(f"\n{'metric':<36} {'baseline':>10} {'current':>10} {'change':>8}")
+    for path, higher_is_worse in BASELINE_METRICS:
+        old, new = lookup(baseline, path), lookup(report, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        regressed = change > tolerance if higher_is_worse else change < -tolerance
+        name = '.'.join(path)
+        print(f"{name:<36} {old:>10} {new:>10} {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def print_summary(report: dict):
+    print(f"\nClients: {report['config']['clients']} (slow: {report['config']['slow']}), "
+          f"{report['config']['duration']}s measured")
+    for name, group in report["groups"].items():
+        fps, latency = group["fps"], group["latency_ms"]
+        print(f"  {name:<7} fps min/median/max {fps['min']}/{fps['median']}/{fps['max']}  "
+              f"latency p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms  "
+              f"errors {group['errors']}")
+    server = report["server"]
+    if server["cpu_percent"]:
+        print(f"  server  CPU mean/max {server['cpu_percent']['mean']}/{server['cpu_percent']['max']}%  "
+              f"RSS max {server['rss_mb']['max']} MB")
+    if server["governor"]:
+        print(f"  governor level {server['governor'].get('level')} ({server['governor'].get('level_name')})")
+    print(f"  load generator CPU {report['load_generator_cpu_percent']}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=200, help="Total WebSocket viewers")
+    parser.add_argument('--slow', type=int, default=20, help="How many of them read slowly")
+    parser.add_argument('--slow-delay', type=float, default=0.5, help="Pause after each frame for slow readers, s")
+    parser.add_argument('--duration', type=float, default=30.0, help="Measurement window, s")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Time after all clients connect before measuring, s")
+    parser.add_argument('--ramp', type=float, default=5.0, help="Spread client connections over this time, s")
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Client processes (one event loop each)")
+    parser.add_argument('--latency-every', type=int, default=5, help="Decode timestamp on every Nth frame per client")
+    parser.add_argument('--camera-fps', type=float, default=15.0)
+    parser.add_argument('--camera-size', default='1280x720')
+    parser.add_argument('--motion', action='store_true', help="Keep motion detection enabled (moving object in frame)")
+    parser.add_argument('--mongo-url', help="MongoDB for the spawned server; in-memory mongomock-motor if omitted")
+    parser.add_argument('--server-url', help="Use an already running server instead of spawning one")
+    parser.add_argument('--server-pid', type=int, help="PID of --server-url process for CPU/RSS sampling")
+    parser.add_argument('--camera-url', help="Camera URL reachable from the server (default: local synthetic camera)")
+    parser.add_argument('--output', help="Write JSON report here")
+    parser.add_argument('--baseline', help="Compare with a previous JSON report, exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative change vs baseline")
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.mongo_url)
+        return 0
+
+    width, height = (int(v) for v in args.camera_size.lower().split('x'))
+    camera = None
+    if not args.camera_url:
+        camera = start_synthetic_camera((width, height), args.camera_fps, args.motion)
+        args.camera_url = f"http://127.0.0.1:{camera.server_address[1]}/camera.mjpg"
+
+    server_process = None
+    server_pid = args.server_pid
+    base_url = args.server_url
+    if not base_url:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        command = [sys.executable, str(Path(__file__).resolve()), '--serve', str(port)]
+        if args.mongo_url:
+            command += ['--mongo-url', args.mongo_url]
+        server_process = subprocess.Popen(command, cwd=str(BACKEND_DIR))
+        server_pid = server_process.pid
+    api_url = f"{base_url.rstrip('/')}/api"
+
+    sampler = None
+    camera_id = None
+    try:
+        wait_for_server(api_url, server_process)
+        camera_id = setup_camera(api_url, args.camera_url, args.motion)
+        ws_url = api_url.replace('https://', 'wss://').replace('http://', 'ws://') + f"/ws/camera/{camera_id}"
+        print(f"Camera {camera_id} started, connecting {args.clients} viewers via {args.workers} workers")
+
+        if server_pid and os.path.exists(f"/proc/{server_pid}"):
+            sampler = ProcessSampler(server_pid)
+            sampler.start()
+
+        # Медленные клиенты равномерно перемешаны с обычными
+        now = time.time()
+        measure_start = now + 1.0 + args.ramp + args.warmup
+        measure_end = measure_start + args.duration
+        slow_clients = {index * args.clients // args.slow for index in range(args.slow)} if args.slow else set()
+        batches = [[] for _ in range(args.workers)]
+        for index in range(args.clients):
+            slow_delay = args.slow_delay if index in slow_clients else 0.0
+            connect_at = now + 1.0 + args.ramp * index / args.clients
+            batches[index % args.workers].append((index, slow_delay, connect_at))
+
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(run_client_batch, batch, ws_url, args.latency_every, measure_start, measure_end)
+                for batch in batches if batch
+            ]
+            if sampler:
+                time.sleep(max(0.0, measure_start - time.time()))
+                sampler.collecting = True
+            results = []
+            workers_cpu = 0.0
+            for future in futures:
+                batch_results = future.result()
+                results.extend(batch_results)
+                if batch_results:
+                    workers_cpu += batch_results[0]["worker_cpu_seconds"]
+        if sampler:
+            sampler.stop()
+
+        try:
+            governor_state = requests.get(f"{api_url}/governor", timeout=10).json()
+        except (requests.RequestException, ValueError):
+            governor_state = None
+        report = build_report(args, results, sampler, governor_state, workers_cpu)
+    finally:
+        if sampler and sampler.is_alive():
+            sampler.stop()
+        if camera_id:
+            try:
+                requests.delete(f"{api_url}/cameras/{camera_id}", timeout=30)
+            except requests.RequestException:
+                pass
+        if server_process:
+            server_process.terminate()
+            try:
+                server_process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+        if camera:
+            camera.shutdown()
+
+    print_summary(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.output}")
+    if args.baseline:
+        regressions = compare_with_baseline(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+        print("\nNo regressions vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())